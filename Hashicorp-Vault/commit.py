@@ -10,15 +10,24 @@ import subprocess
 import os
 import sys
 import argparse
-import tempfile
 import itertools
 import threading
 import time
 import logging
-from pathlib import Path
+import re
+import fnmatch
+import hashlib
+import queue
+import codecs
+import contextlib
 
 # Default configuration
 MODEL_NAME = "openai/gpt-4.1"  # Alternative: 'mistral-ai/codestral-2501'
+FALLBACK_MODEL = "openai/gpt-3.5-turbo"
+# Seconds the primary model runs alone before the fallback joins the race
+RACE_HEAD_START = 3.0
+# Seconds after which a model call is cancelled
+MODEL_TIMEOUT = 60.0
 COMMIT_MESSAGE_PROMPT = """
 Write a meaningful commit message in the conventional commit convention by trying to understand 
 what was the benefits the code author wanted to add by his changes to codebase with this commit. 
@@ -33,6 +42,76 @@ Requirements:
 - Be brief and concise throughout.
 - Output only the commit message."""
 
+# Approximate token budget for the diff part of the prompt (about 4 characters per token)
+DIFF_TOKEN_BUDGET = 2000
+CHARS_PER_TOKEN = 4
+# Smallest share of the budget given to any file that has changes
+MIN_FILE_TOKENS = 40
+# Most files named in the "Files not shown" list; the rest are only counted
+MAX_LISTED_OMITTED = 30
+
+# Paths whose diffs carry no useful signal for a commit message
+IGNORED_DIFF_PATTERNS = [
+    "*.lock", "*-lock.json", "*-lock.yaml", "*.lockb", "go.sum", ".terraform.lock.hcl",
+    "*.min.js", "*.min.css", "*.map",
+    ".aws-sam/*", "*/.aws-sam/*", "node_modules/*", "*/node_modules/*",
+    "vendor/*", "*/vendor/*", "dist/*", "*/dist/*", "*/__pycache__/*", "*.pyc",
+]
+
+# Map-reduce mode: very large diffs are summarised per group of files in parallel,
+# then the commit message is written from the summaries
+MAP_GROUP_TOKENS = 3000
+MAP_REDUCE_WORKERS = 4
+# Budget for a group's raw diff when its summary could not be generated
+MAP_FALLBACK_TOKENS = 300
+GROUP_SUMMARY_PROMPT = """
+Summarise the following part of a 'git diff --staged' output for a colleague who will
+write the commit message. List what changed and why it was likely changed, one bullet per
+change, in at most 8 short bullets. Output only the bullets."""
+REDUCE_PROMPT = """
+Write a meaningful commit message in the conventional commit convention by trying to understand 
+what was the benefits the code author wanted to add by his changes to codebase with this commit. 
+The staged diff was too large to send at once, so I'll send you summaries of its parts instead. 
+
+Requirements:
+- Lines must not be longer than 74 characters. 
+- Use EN language to answer. 
+- Try to use line breaks, only after a dot, to help making the commit message easier to read..
+- Use bullet points to list the changes (do not mention filename extensions).
+- Follow the bullet points with a single sentence explaining the necessity of these changes.
+- Be brief and concise throughout.
+- Output only the commit message."""
+
+# Seconds the remote model may take in total before the local backend writes the message
+LATENCY_BUDGET = 20.0
+# Definitions picked up by the local backend as symbol names, across the languages in this repo
+SYMBOL_PATTERNS = [
+    re.compile(r'^\s*(?:async\s+)?def\s+(\w+)'),
+    re.compile(r'^\s*class\s+(\w+)'),
+    re.compile(r'^\s*(?:export\s+)?(?:async\s+)?function\s+(\w+)'),
+    re.compile(r'^\s*(?:export\s+)?(?:const|let)\s+(\w+)\s*=\s*(?:async\s*)?\('),
+    re.compile(r'^\s*func\s+(?:\([^)]*\)\s*)?(\w+)'),
+    re.compile(r'^\s*(?:resource|data)\s+"\w+"\s+"([\w-]+)"'),
+    re.compile(r'^\s*(?:module|variable|output)\s+"([\w-]+)"'),
+]
+
+# Warm worker for the prepare-commit-msg hook: seconds between checks of the index
+WORKER_POLL_INTERVAL = 1.0
+HOOK_MARKER = "# prepare-commit-msg hook installed by commit.py"
+
+# Split mode: staged files are grouped by their first directories, and merged with
+# files they were committed together with at least CO_CHANGE_MIN times recently
+SPLIT_DEPTH = 2
+CO_CHANGE_COMMITS = 200
+CO_CHANGE_MIN = 3
+
+# Wall time per phase of a run, reported with --stats
+_phase_timings = {}
+
+# Generated messages are cached per staged tree, backend, model and prompt; least recently used go first
+CACHE_DIR = os.path.expanduser("~/.autocommit/cache")
+MESSAGE_CACHE_SIZE = 200
+
 
 def setup_logging():
     """Set up logging for the script."""
@@ -51,32 +130,39 @@ def setup_logging():
 
 def load_config():
     """Load configuration from .autocommit.yaml if it exists."""
-    try:
-        import yaml
-    except ImportError:
-        print("PyYAML not installed. Using default configuration.")
-        return {
-            "model": MODEL_NAME,
-            "prompt": COMMIT_MESSAGE_PROMPT,
-            "auto_push": False,
-            "allow_edit": True
-        }
-    
     config_path = os.path.expanduser("~/.autocommit.yaml")
     default_config = {
         "model": MODEL_NAME,
         "prompt": COMMIT_MESSAGE_PROMPT,
         "auto_push": False,
-        "allow_edit": True
+        "allow_edit": True,
+        "diff_token_budget": DIFF_TOKEN_BUDGET,
+        "fallback_model": FALLBACK_MODEL,
+        "race": False,
+        "race_head_start": RACE_HEAD_START,
+        "timeout": MODEL_TIMEOUT,
+        "map_reduce": False,
+        "map_reduce_workers": MAP_REDUCE_WORKERS,
+        "backend": "gh",
+        "latency_budget": LATENCY_BUDGET
     }
     
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                return {**default_config, **(config or {})}
-        except Exception as e:
-            print(f"Error loading config: {e}")
+    # PyYAML takes longer to import than the rest of the script; skip it when there is no config
+    if not os.path.exists(config_path):
+        return default_config
+    
+    try:
+        import yaml
+    except ImportError:
+        print("PyYAML not installed. Using default configuration.")
+        return default_config
+    
+    try:
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+            return {**default_config, **(config or {})}
+    except Exception as e:
+        print(f"Error loading config: {e}")
     
     return default_config
 
@@ -92,6 +178,41 @@ def parse_arguments():
                         help='Skip the push confirmation prompt')
     parser.add_argument('--edit', action='store_true', default=config["allow_edit"],
                         help='Allow editing the generated commit message')
+    parser.add_argument('--diff-budget', type=int, default=config["diff_token_budget"],
+                        help=f'Approximate token budget for the diff sent to the model '
+                             f'(default: {config["diff_token_budget"]})')
+    parser.add_argument('--fallback-model', type=str, default=config["fallback_model"],
+                        help=f'Model used when the primary one fails or is slow (default: {config["fallback_model"]})')
+    parser.add_argument('--race', action='store_true', default=config["race"],
+                        help='Run the fallback model concurrently with the primary one and use the first answer')
+    parser.add_argument('--head-start', type=float, default=config["race_head_start"],
+                        help=f'Seconds the primary model runs alone when racing (default: {config["race_head_start"]})')
+    parser.add_argument('--timeout', type=float, default=config["timeout"],
+                        help=f'Seconds before a model call is cancelled (default: {config["timeout"]})')
+    parser.add_argument('--split', action='store_true',
+                        help='Split the staged changes into logical groups and commit each with its own message')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=config["backend"],
+                        help=f'Message generator: gh models, or local heuristics that need no network '
+                             f'(default: {config["backend"]})')
+    parser.add_argument('--latency-budget', type=float, default=config["latency_budget"],
+                        help=f'Seconds the remote model may take before the local backend is used instead; '
+                             f'0 disables the local fallback (default: {config["latency_budget"]})')
+    parser.add_argument('--map-reduce', action='store_true', default=config["map_reduce"],
+                        help='Summarise very large diffs per group of files in parallel before writing the message')
+    parser.add_argument('--workers', type=int, default=config["map_reduce_workers"],
+                        help=f'Parallel model calls in map-reduce mode (default: {config["map_reduce_workers"]})')
+    parser.add_argument('--benchmark-map-reduce', action='store_true',
+                        help='Measure single-prompt and map-reduce latency on synthetic diffs of growing size')
+    parser.add_argument('--install-hook', action='store_true',
+                        help='Install a prepare-commit-msg hook that fills in the message on git commit')
+    parser.add_argument('--worker', action='store_true',
+                        help='Run a warm worker that pre-generates messages for the hook as files are staged')
+    parser.add_argument('--hook', nargs='+', metavar='ARG',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Regenerate the commit message even if one is cached for the staged changes')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print how long each phase of the run took')
     parser.add_argument('--help-config', action='store_true',
                         help='Show configuration help')
     return parser.parse_args()
@@ -109,6 +230,15 @@ def show_help_config():
       Write a meaningful commit message in the conventional commit convention...
     auto_push: false
     allow_edit: true
+    diff_token_budget: 2000
+    fallback_model: openai/gpt-3.5-turbo
+    race: false
+    race_head_start: 3.0
+    timeout: 60
+    map_reduce: false
+    map_reduce_workers: 4
+    backend: gh
+    latency_budget: 20
     
     Example:
     ```yaml
@@ -116,6 +246,12 @@ def show_help_config():
     auto_push: true
     allow_edit: false
     ```
+    
+    Hook mode:
+    Run `commit.py --install-hook` in a repository to fill in the message whenever you
+    run `git commit`. Start `commit.py --worker` in the background to generate the
+    message as soon as files are staged, so the editor opens without waiting for the
+    model. The hook latency is logged to ~/.autocommit/autocommit.log.
     """
     print(help_text)
 
@@ -131,6 +267,32 @@ def check_git_repo():
         return False
 
 
+@contextlib.contextmanager
+def timed_phase(name):
+    """Add the wall time of the enclosed block to the named phase."""
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        _phase_timings[name] = _phase_timings.get(name, 0.0) + time.monotonic() - started
+
+
+def report_phase_timings(total):
+    """Print and log the phase timings of the run."""
+    logger = logging.getLogger("autocommit")
+    # Waiting for the model and the user is not overhead of the script
+    overhead = total - _phase_timings.get("model", 0.0) - _phase_timings.get("edit", 0.0)
+
+    print(f"\n{'phase':<10}{'seconds':>10}")
+    for name in ("config", "git", "model", "edit", "commit", "push"):
+        if name in _phase_timings:
+            print(f"{name:<10}{_phase_timings[name]:>10.3f}")
+    print(f"{'total':<10}{total:>10.3f}")
+    print(f"{'overhead':<10}{overhead:>10.3f}  (total without model and edit)")
+    logger.info("Phase timings: " + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in _phase_timings.items())
+                + f", overhead={overhead:.3f}s")
+
+
 def show_spinner(message):
     """Show a spinner while waiting for a process."""
     spinner = itertools.cycle(['-', '/', '|', '\\'])
@@ -156,24 +318,38 @@ def show_spinner(message):
     return stop
 
 
-def get_git_diff():
+def has_staged_changes(env=None):
+    """
+    Check for staged changes by exit code alone; git stops at the first
+    difference and never scans the work tree for untracked files.
+    Returns: True or False, None outside a git repository
+    """
+    result = subprocess.run(['git', 'diff', '--staged', '--quiet'],
+                            capture_output=True,
+                            env=env)
+    if result.returncode in (0, 1):
+        return result.returncode == 1
+    return None
+
+
+def get_git_diff(env=None):
     """Get git diff of only staged changes."""
     try:
-        # Check if there are any staged changes to commit
-        status = subprocess.run(['git', 'status', '--porcelain'],
-                               capture_output=True,
-                               text=True,
-                               check=True)
-        
-        if not status.stdout.strip():
-            print("No changes to commit.")
+        # Check if there are any staged changes to commit before fetching them
+        staged = has_staged_changes(env)
+        if staged is None:
+            print("Error: Not a git repository. Please run from a git repository.")
+            return None
+        if not staged:
+            print("No staged changes to commit. Use 'git add' to stage changes.")
             return None
             
         # Get only staged diffs
         result = subprocess.run(['git', 'diff', '--staged', '--minimal'],
                                 capture_output=True,
                                 text=True,
-                                check=True)
+                                check=True,
+                                env=env)
         
         if not result.stdout.strip():
             print("No staged changes to commit. Use 'git add' to stage changes.")
@@ -185,39 +361,582 @@ def get_git_diff():
         return None
 
 
-def get_commit_message(system_prompt, git_diff_output, model_name):
+def get_staged_changes(env=None):
+    """
+    Return the raw listing of staged changes (paths and blob ids), which is
+    cheap even when the diff itself is huge, or None when nothing is staged.
+    """
+    try:
+        result = subprocess.run(['git', 'diff', '--staged', '--raw', '--no-abbrev'],
+                                capture_output=True,
+                                text=True,
+                                check=True,
+                                env=env)
+    except subprocess.CalledProcessError as e:
+        print(f"Error getting staged changes: {str(e)}")
+        return None
+
+    if not result.stdout.strip():
+        print("No staged changes to commit. Use 'git add' to stage changes.")
+        return None
+    return result.stdout
+
+
+def iter_file_diffs(lines):
+    """Yield the diff of each file from an iterable of diff lines, one file at a time."""
+    current = []
+    for line in lines:
+        if line.startswith('diff --git ') and current:
+            yield "".join(current)
+            current = []
+        current.append(line)
+    if current:
+        yield "".join(current)
+
+
+def group_file_diffs(file_diffs, group_tokens=MAP_GROUP_TOKENS):
+    """
+    Batch consecutive file diffs into groups of about group_tokens tokens.
+    git orders files by path, so a group tends to cover one module.
+    """
+    group = []
+    size = 0
+    for file_diff in file_diffs:
+        tokens = estimate_tokens(file_diff)
+        if group and size + tokens > group_tokens:
+            yield "".join(group)
+            group = []
+            size = 0
+        group.append(file_diff)
+        size += tokens
+    if group:
+        yield "".join(group)
+
+
+def parse_diff(diff_text):
+    """Split a unified git diff into per-file entries with their hunks."""
+    files = []
+    entry = None
+    hunk = None
+
+    for line in diff_text.splitlines():
+        if line.startswith('diff --git '):
+            match = re.match(r'diff --git a/(.*) b/(.*)$', line)
+            entry = {
+                "path": match.group(2) if match else line[len('diff --git '):],
+                "header": [line],
+                "hunks": [],
+                "added": 0,
+                "removed": 0,
+                "binary": False
+            }
+            files.append(entry)
+            hunk = None
+        elif entry is None:
+            continue
+        elif line.startswith('@@'):
+            hunk = [line]
+            entry["hunks"].append(hunk)
+        elif hunk is None:
+            # Keep the header lines that say something the path does not
+            if line.startswith(('new file', 'deleted file', 'rename from', 'rename to')):
+                entry["header"].append(line)
+            elif line.startswith(('Binary files', 'GIT binary patch')):
+                entry["binary"] = True
+        else:
+            hunk.append(line)
+            if line.startswith('+'):
+                entry["added"] += 1
+            elif line.startswith('-'):
+                entry["removed"] += 1
+
+    return files
+
+
+def omit_reason(entry):
+    """Return why a file's diff should not be sent to the model, or None to keep it."""
+    if entry["binary"]:
+        return "binary"
+    path = entry["path"]
+    name = os.path.basename(path)
+    for pattern in IGNORED_DIFF_PATTERNS:
+        if fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern):
+            return "lockfile/vendored"
+    return None
+
+
+def collapse_hunks(hunks):
+    """Drop hunks that repeat the changes of an earlier hunk, noting how often they recur."""
+    kept = []
+    repeats = {}
+
+    for hunk in hunks:
+        key = tuple(line.strip() for line in hunk[1:] if line.startswith(('+', '-')))
+        if key in repeats:
+            repeats[key] += 1
+            continue
+        repeats[key] = 0
+        kept.append((key, hunk))
+
+    collapsed = []
+    for key, hunk in kept:
+        if repeats[key]:
+            hunk = hunk + [f"... same change repeated in {repeats[key]} more hunk(s)"]
+        collapsed.append(hunk)
+    return collapsed
+
+
+def estimate_tokens(text):
+    """Rough token count of a text."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def allocate_budget(costs, token_budget):
+    """
+    Split a token budget across files in proportion to their size, never
+    giving a file more than it needs. Small files are served first, so what
+    they leave over goes to the larger ones.
+    """
+    allocation = {}
+    remaining_budget = token_budget
+    remaining_cost = sum(costs.values())
+
+    for key in sorted(costs, key=costs.get):
+        share = remaining_budget * costs[key] // remaining_cost if remaining_cost else 0
+        grant = min(costs[key], max(share, MIN_FILE_TOKENS), remaining_budget)
+        allocation[key] = grant
+        remaining_budget -= grant
+        remaining_cost -= costs[key]
+
+    return allocation
+
+
+def render_file(entry, token_budget=None):
+    """Render a file's diff, cut off at the end of its token budget if one is given."""
+    lines = list(entry["header"])
+    body = [line for hunk in entry["hunks"] for line in hunk]
+    if token_budget is None:
+        return "\n".join(lines + body)
+
+    # Leave room for the truncation note, so the result stays within the budget
+    total_changed = sum(1 for line in body if line.startswith(('+', '-')))
+    char_budget = (token_budget * CHARS_PER_TOKEN - len("\n".join(lines))
+                   - len(f"\n... diff truncated, {total_changed} more changed lines"))
+
+    for index, line in enumerate(body):
+        char_budget -= len(line) + 1
+        if char_budget < 0:
+            changed = sum(1 for rest in body[index:] if rest.startswith(('+', '-')))
+            lines.append(f"... diff truncated, {changed} more changed lines")
+            break
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def render_placeholder(entry):
+    """Render a file as its first header line and line counts, without its diff."""
+    return f"{entry['header'][0]}\n... diff omitted, +{entry['added']} -{entry['removed']} lines"
+
+
+def render_omitted(omitted, total, token_budget):
+    """
+    Render the "Files not shown" list of total files from the first entries
+    in omitted, naming at most MAX_LISTED_OMITTED files and fewer when the
+    list would not fit in token_budget.
+    """
+    if not total:
+        return ""
+    listed = min(len(omitted), MAX_LISTED_OMITTED)
+    while True:
+        lines = [f"- {line}" for line in omitted[:listed]]
+        if total > listed:
+            lines.append(f"- ... and {total - listed} more files")
+        text = "\nFiles not shown:\n" + "\n".join(lines)
+        if listed == 0 or estimate_tokens(text) <= token_budget:
+            return text
+        listed -= 1
+
+
+def summarize_diff(diff_text, token_budget=DIFF_TOKEN_BUDGET):
+    """
+    Reduce a staged diff to roughly token_budget tokens: drop binary,
+    lockfile and vendored files, collapse repeated hunks and share the
+    budget across the remaining files by change size. Every file shown
+    costs at least its placeholder line; when those do not fit, the
+    smallest changes move to the "Files not shown" list, which is capped.
+    """
+    files = parse_diff(diff_text)
+    kept = []
+    omitted = []
+
+    for entry in files:
+        reason = omit_reason(entry)
+        if reason:
+            omitted.append(f"{entry['path']} (+{entry['added']} -{entry['removed']}, {reason})")
+            continue
+        entry["hunks"] = collapse_hunks(entry["hunks"])
+        kept.append(entry)
+
+    placeholders = [estimate_tokens(render_placeholder(entry)) for entry in kept]
+
+    # Largest changes first; drop from the end until the placeholders and the
+    # list of files not shown fit in the budget
+    by_size = sorted(range(len(kept)), key=lambda index: kept[index]["added"] + kept[index]["removed"],
+                     reverse=True)
+    reserved = sum(placeholders)
+    shown = len(by_size)
+    while True:
+        # Only the entries that can be named are rendered
+        dropped = [f"{kept[index]['path']} (+{kept[index]['added']} -{kept[index]['removed']}, over budget)"
+                   for index in by_size[shown:shown + MAX_LISTED_OMITTED]]
+        footer = render_omitted(omitted[:MAX_LISTED_OMITTED] + dropped,
+                                len(omitted) + len(by_size) - shown, token_budget)
+        available = token_budget - estimate_tokens(footer)
+        if reserved <= available or shown == 0:
+            break
+        shown -= 1
+        reserved -= placeholders[by_size[shown]]
+
+    selected = sorted(by_size[:shown])
+    rendered = {index: render_file(kept[index]) for index in selected}
+    costs = {index: estimate_tokens(rendered[index]) for index in selected}
+    extra = allocate_budget({index: max(costs[index] - placeholders[index], 0) for index in selected},
+                            max(available - reserved, 0))
+
+    sections = []
+    for index in selected:
+        entry = kept[index]
+        grant = placeholders[index] + extra[index]
+        if grant >= costs[index]:
+            sections.append(rendered[index])
+            continue
+        truncated = render_file(entry, grant)
+        # A budget too small for the header and the note falls back to the placeholder
+        sections.append(truncated if estimate_tokens(truncated) <= grant else render_placeholder(entry))
+
+    return "\n".join(sections) + footer
+
+
+def get_staged_tree(env=None):
+    """Return the object name of the tree the index would commit, or None."""
+    try:
+        result = subprocess.run(['git', 'write-tree'],
+                                capture_output=True,
+                                text=True,
+                                check=True,
+                                env=env)
+        return result.stdout.strip()
+    except subprocess.CalledProcessError:
+        return None
+
+
+def message_cache_key(tree, backend, model_name, prompt):
+    """Content address of a generated message."""
+    digest = hashlib.sha256()
+    for part in (tree, backend, model_name, prompt):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def read_cached_message(cache_key):
+    """Return the cached message for the key, or None on a miss."""
+    path = os.path.join(CACHE_DIR, cache_key)
+    try:
+        with open(path, 'r') as f:
+            message = f.read()
+        # Mark as recently used for the LRU eviction
+        os.utime(path)
+        return message
+    except OSError:
+        return None
+
+
+def cache_generated_message(args, cache_key, message, backend):
+    """
+    Cache a generated message under the key of the requested backend, unless
+    a fallback produced it: the requested backend should be retried next time.
+    """
+    if message and cache_key and backend == args.backend:
+        write_cached_message(cache_key, message)
+
+
+def write_cached_message(cache_key, message):
+    """Cache a generated message, evicting the least recently used entries."""
+    logger = logging.getLogger("autocommit")
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = os.path.join(CACHE_DIR, f".{cache_key}.{os.getpid()}")
+        with open(temp_path, 'w') as f:
+            f.write(message)
+        os.replace(temp_path, os.path.join(CACHE_DIR, cache_key))
+
+        entries = [entry for entry in os.scandir(CACHE_DIR) if entry.is_file() and not entry.name.startswith('.')]
+        if len(entries) > MESSAGE_CACHE_SIZE:
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - MESSAGE_CACHE_SIZE]:
+                os.unlink(entry.path)
+    except OSError as e:
+        logger.warning(f"Could not write message cache: {e}")
+
+
+def build_prompt(system_prompt, git_diff_output):
+    """Combine the system prompt and the diff into the model input."""
+    return f'{system_prompt}"""{git_diff_output}"""'
+
+
+def stream_model_output(model_name, prompt, timeout=MODEL_TIMEOUT):
+    """
+    Run a model through the GitHub CLI and print its output as it streams in.
+    The spinner only runs until the first output arrives; the child process
+    is killed when the whole call takes longer than timeout seconds.
+    Returns: the model output
+    Raises: subprocess.CalledProcessError, subprocess.TimeoutExpired
+    """
+    logger = logging.getLogger("autocommit")
+    command = ['gh', 'models', 'run', model_name]
+    started = time.monotonic()
+    deadline = started + timeout
+
+    process = subprocess.Popen(command,
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    chunks = queue.Queue()
+    stderr_output = []
+
+    def feed():
+        try:
+            process.stdin.write(prompt.encode('utf-8'))
+            process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+
+    def pump():
+        for chunk in iter(lambda: process.stdout.read1(4096), b''):
+            chunks.put(chunk)
+        chunks.put(None)
+
+    def drain():
+        stderr_output.append(process.stderr.read())
+
+    for target in (feed, pump, drain):
+        threading.Thread(target=target, daemon=True).start()
+
+    stop_spinner = show_spinner("Generating commit message ")
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    output = []
+
+    try:
+        while True:
+            try:
+                chunk = chunks.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(command, timeout)
+            if chunk is None:
+                break
+
+            if stop_spinner:
+                stop_spinner()
+                stop_spinner = None
+                logger.info(f"Model {model_name} time to first token: {time.monotonic() - started:.2f}s")
+
+            text = decoder.decode(chunk)
+            output.append(text)
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+        returncode = process.wait(timeout=max(deadline - time.monotonic(), 0))
+    except BaseException:
+        # Timeouts and Ctrl-C must not leave the model call running
+        process.kill()
+        process.wait()
+        if output and not output[-1].endswith('\n'):
+            sys.stdout.write('\n')
+        raise
+    finally:
+        if stop_spinner:
+            stop_spinner()
+
+    output.append(decoder.decode(b'', final=True))
+    text = "".join(output)
+    if text and not text.endswith('\n'):
+        sys.stdout.write('\n')
+    logger.info(f"Model {model_name} answered in {time.monotonic() - started:.2f}s")
+
+    if returncode != 0:
+        stderr = stderr_output[0].decode('utf-8', errors='replace') if stderr_output else ''
+        raise subprocess.CalledProcessError(returncode, command, output=text, stderr=stderr)
+    return text
+
+
+def gh_backend(system_prompt, git_diff_output, model_name, timeout):
+    """Backend running the model through the GitHub CLI, printing the message as it is generated."""
+    prompt = build_prompt(system_prompt, git_diff_output)
+    return stream_model_output(model_name, prompt, timeout).replace("```", "").strip()
+
+
+def extract_symbols(lines):
+    """Return the names defined on the given diff lines, in order of appearance."""
+    symbols = []
+    for line in lines:
+        for pattern in SYMBOL_PATTERNS:
+            match = pattern.match(line[1:])
+            if match and match.group(1) not in symbols:
+                symbols.append(match.group(1))
+                break
+    return symbols
+
+
+def describe_names(names, limit=3):
+    """Join names for a sentence, summarising the ones past the limit."""
+    if len(names) > limit:
+        return f"{', '.join(names[:limit])} and {len(names) - limit} more"
+    if len(names) > 1:
+        return f"{', '.join(names[:-1])} and {names[-1]}"
+    return names[0] if names else ""
+
+
+def classify_change(entries, added_symbols):
+    """Pick the conventional-commit type of a change from its paths and statistics."""
+    paths = [entry["path"] for entry in entries]
+
+    def all_match(*patterns):
+        return all(any(fnmatch.fnmatch(path, pattern) for pattern in patterns) for path in paths)
+
+    if all_match("*requirements*.txt", "Pipfile*", "pyproject.toml", "setup.py", "package.json",
+                 "*.lock", "*-lock.json", "Dockerfile", "Makefile", "*.sh"):
+        return "build"
+    if all_match("*.md", "*.rst", "*.txt", "docs/*", "*/docs/*", "LICENSE*"):
+        return "docs"
+    if all_match("test*", "*/test*", "*_test.*", "*.test.*", "*/tests/*"):
+        return "test"
+    if all_match(".github/*", "*.gitlab-ci.yml", "buildspec*.yml", ".pre-commit-config.yaml"):
+        return "ci"
+    if added_symbols or any(line.startswith('new file') for entry in entries for line in entry["header"]):
+        return "feat"
+    if all(any(line.startswith('rename from') for line in entry["header"]) for entry in entries):
+        return "refactor"
+    if sum(entry["removed"] for entry in entries) > sum(entry["added"] for entry in entries):
+        return "refactor"
+    return "fix"
+
+
+def common_directory(paths):
+    """Return the directory shared by all paths, as a list of path components."""
+    directories = [path.split('/')[:-1] for path in paths]
+    shared = []
+    for parts in zip(*directories):
+        if len(set(parts)) != 1:
+            break
+        shared.append(parts[0])
+    return shared
+
+
+def local_backend(system_prompt, git_diff_output, model_name, timeout):
+    """
+    Backend deriving a conventional-commit message from the diff alone:
+    changed paths, change types and the names of added or removed
+    definitions. Deterministic, instant and offline; the prompt, model and
+    timeout are ignored.
+    """
+    import textwrap
+
+    entries = [entry for entry in parse_diff(git_diff_output) if not omit_reason(entry)]
+    entries = entries or parse_diff(git_diff_output)
+    if not entries:
+        return None
+
+    # Name files relative to the directory they share, which becomes the scope
+    shared = common_directory([entry["path"] for entry in entries])
+    prefix = "/".join(shared) + "/" if shared else ""
+    scope = shared[-1] if shared else None
+
+    bullets = []
+    verbs = []
+    all_added = []
+    for entry in entries:
+        name = os.path.splitext(entry["path"][len(prefix):])[0]
+        lines = [line for hunk in entry["hunks"] for line in hunk[1:]]
+        plus = extract_symbols([line for line in lines if line.startswith('+')])
+        minus = extract_symbols([line for line in lines if line.startswith('-')])
+        added = [symbol for symbol in plus if symbol not in minus]
+        removed = [symbol for symbol in minus if symbol not in plus]
+        changed = [symbol for symbol in plus if symbol in minus]
+        all_added.extend(added)
+
+        headers = entry["header"][1:]
+        if any(line.startswith('new file') for line in headers):
+            verb, bullet = "add", f"Add {name}"
+        elif any(line.startswith('deleted file') for line in headers):
+            verb, bullet = "remove", f"Remove {name}"
+        elif any(line.startswith('rename from') for line in headers):
+            old_name = next(line[len('rename from '):] for line in headers if line.startswith('rename from'))
+            verb, bullet = "rename", f"Rename {os.path.splitext(old_name[len(prefix):] if old_name.startswith(prefix) else old_name)[0]} to {name}"
+        else:
+            verb, bullet = "update", f"Update {name}"
+        verbs.append(verb)
+
+        details = []
+        if added:
+            details.append(f"add {describe_names(added)}")
+        if changed:
+            details.append(f"change {describe_names(changed)}")
+        if removed:
+            details.append(f"remove {describe_names(removed)}")
+        if details:
+            bullet += ": " + "; ".join(details)
+        bullets.append(f"{bullet} (+{entry['added']}/-{entry['removed']})")
+
+    change_type = classify_change(entries, all_added)
+    if all_added and change_type == "feat":
+        summary = f"add {describe_names(all_added, limit=2)}"
+    else:
+        # Name the kind of change when every file shares it, as the bullets do
+        verb = verbs[0] if len(set(verbs)) == 1 else "update"
+        names = [os.path.splitext(os.path.basename(entry["path"]))[0] for entry in entries]
+        summary = f"{verb} {describe_names(list(dict.fromkeys(names)), limit=2)}"
+        if verb == "rename" and len(entries) == 1:
+            old_name = next(line[len('rename from '):] for line in entries[0]["header"] if line.startswith('rename from'))
+            summary = f"rename {os.path.splitext(os.path.basename(old_name))[0]} to {names[0]}"
+
+    subject = f"{change_type}({scope}): {summary}" if scope else f"{change_type}: {summary}"
+    body = [textwrap.fill(bullet, width=74, initial_indent="- ", subsequent_indent="  ") for bullet in bullets]
+    return textwrap.shorten(subject, width=74, placeholder="...") + "\n\n" + "\n".join(body)
+
+
+# Message generators by name: callables taking (system_prompt, git_diff_output,
+# model_name, timeout) and returning the message, raising on failure
+BACKENDS = {
+    "gh": gh_backend,
+    "local": local_backend,
+}
+
+
+def get_commit_message(system_prompt, git_diff_output, model_name, fallback_model=FALLBACK_MODEL,
+                       timeout=MODEL_TIMEOUT, backend="gh", deadline=None):
     """Generate commit message using AI model."""
     logger = logging.getLogger("autocommit")
     logger.info(f"Generating commit message using model: {model_name}")
     
     try:
-        # Prepare prompt with git diff
-        prompt = f'{system_prompt}"""{git_diff_output}"""'[:8000]
-        
-        # Show spinner while waiting for AI response
-        stop_spinner = show_spinner("Generating commit message ")
-        
-        # Run GitHub CLI models
-        result = subprocess.run(['gh', 'models', 'run', model_name],
-                                input=prompt,
-                                capture_output=True,
-                                text=True,
-                                check=True)
+        # Stay within the overall deadline, if there is one
+        if deadline is not None:
+            timeout = min(timeout, max(deadline - time.monotonic(), 0))
         
-        # Stop spinner
-        stop_spinner()
-        
-        return result.stdout.replace("```", "").strip()
-    except subprocess.CalledProcessError as e:
+        return BACKENDS[backend](system_prompt, git_diff_output, model_name, timeout)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
         print(f"Error running gh models: {str(e)}")
         print(f"stderr: {e.stderr}")
-        logger.error(f"Error with model {model_name}: {e.stderr}")
+        logger.error(f"Error with model {model_name}: {e}; stderr: {e.stderr}")
         
-        # Fallback to simpler model if available
-        if model_name != "openai/gpt-3.5-turbo":
+        # Fallback to simpler model if available and there is time left for it
+        if fallback_model and model_name != fallback_model and (deadline is None or time.monotonic() < deadline):
             print("Trying fallback model...")
-            logger.info("Falling back to gpt-3.5-turbo")
-            return get_commit_message(system_prompt, git_diff_output, "openai/gpt-3.5-turbo")
+            logger.info(f"Falling back to {fallback_model}")
+            return get_commit_message(system_prompt, git_diff_output, fallback_model, fallback_model=None,
+                                      timeout=timeout, backend=backend, deadline=deadline)
         return None
     except FileNotFoundError as e:
         print(f"Error: GitHub CLI not found. Please install it with 'brew install gh' or visit https://cli.github.com/")
@@ -225,8 +944,239 @@ def get_commit_message(system_prompt, git_diff_output, model_name):
         return None
 
 
+def complete(model_name, prompt, timeout=MODEL_TIMEOUT):
+    """
+    Run a model through the GitHub CLI without printing anything
+    Returns: the model output
+    Raises: subprocess.CalledProcessError, subprocess.TimeoutExpired
+    """
+    result = subprocess.run(['gh', 'models', 'run', model_name],
+                            input=prompt,
+                            capture_output=True,
+                            text=True,
+                            check=True,
+                            timeout=timeout)
+    return result.stdout.replace("```", "").strip()
+
+
+def summarize_group(model_name, group_diff, timeout=MODEL_TIMEOUT, deadline=None):
+    """Map step: summarise one group of file diffs, falling back to a trimmed raw diff."""
+    logger = logging.getLogger("autocommit")
+    started = time.monotonic()
+    if deadline is not None:
+        timeout = min(timeout, deadline - started)
+        if timeout <= 0:
+            return summarize_diff(group_diff, MAP_FALLBACK_TOKENS)
+
+    group_prompt = build_prompt(GROUP_SUMMARY_PROMPT, summarize_diff(group_diff, MAP_GROUP_TOKENS))
+    try:
+        summary = complete(model_name, group_prompt, timeout)
+        logger.info(f"Summarised {len(group_diff)} diff characters in {time.monotonic() - started:.2f}s")
+        if summary:
+            return summary
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        # OSError covers a missing GitHub CLI; the reduce step then fails the same
+        # way and the caller can fall back to the local backend
+        logger.error(f"Could not summarise a diff group with {model_name}: {e}")
+    return summarize_diff(group_diff, MAP_FALLBACK_TOKENS)
+
+
+def map_reduce_summaries(lines, model_name, timeout=MODEL_TIMEOUT, workers=MAP_REDUCE_WORKERS,
+                         group_tokens=MAP_GROUP_TOKENS, deadline=None):
+    """
+    Summarise a diff, given as an iterable of lines, per group of files on a
+    bounded worker pool. Groups are submitted while the diff is still being
+    read, and at most a few groups are held in memory at a time. No model
+    call outlives the deadline, if one is given.
+    Returns: the group summaries in diff order
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    futures = []
+    # Bound the diff text waiting for a worker to a couple of groups per worker
+    in_flight = threading.BoundedSemaphore(workers * 2)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for group_diff in group_file_diffs(iter_file_diffs(lines), group_tokens):
+            in_flight.acquire()
+            future = pool.submit(summarize_group, model_name, group_diff, timeout, deadline)
+            future.add_done_callback(lambda _: in_flight.release())
+            futures.append(future)
+    return [future.result() for future in futures]
+
+
+def map_reduce_commit_message(model_name, fallback_model=FALLBACK_MODEL, timeout=MODEL_TIMEOUT,
+                              workers=MAP_REDUCE_WORKERS, env=None, deadline=None):
+    """
+    Generate the commit message for a very large staged diff by map-reduce.
+    The map and reduce steps share the deadline, if one is given.
+    """
+    logger = logging.getLogger("autocommit")
+    started = time.monotonic()
+
+    # Stream the diff instead of loading it whole
+    process = subprocess.Popen(['git', 'diff', '--staged', '--minimal'],
+                               stdout=subprocess.PIPE,
+                               text=True,
+                               errors='replace',
+                               env=env)
+    stop_spinner = show_spinner("Summarising staged changes ")
+    try:
+        summaries = map_reduce_summaries(process.stdout, model_name, timeout, workers, deadline=deadline)
+    finally:
+        stop_spinner()
+        process.stdout.close()
+        process.wait()
+
+    logger.info(f"Map step produced {len(summaries)} summaries in {time.monotonic() - started:.2f}s")
+    if not summaries:
+        return None
+    if deadline is not None and time.monotonic() >= deadline:
+        logger.info("Latency budget used up by the map step; skipping the reduce step")
+        return None
+
+    return get_commit_message(REDUCE_PROMPT, "\n\n".join(summaries), model_name,
+                              fallback_model=fallback_model, timeout=timeout, deadline=deadline)
+
+
+def synthetic_diff(files, lines_per_file):
+    """Build a staged-diff-like text with the given number of files and changed lines."""
+    parts = []
+    for index in range(files):
+        path = f"src/module_{index // 10}/file_{index}.py"
+        parts.append(f"diff --git a/{path} b/{path}\nindex 0000000..1111111 100644\n"
+                     f"--- a/{path}\n+++ b/{path}\n@@ -1,{lines_per_file} +1,{lines_per_file} @@\n")
+        for line in range(lines_per_file):
+            parts.append(f"-def handler_{index}_{line}(event):\n")
+            parts.append(f"+def handler_{index}_{line}(event, context=None):\n")
+    return "".join(parts)
+
+
+def benchmark_map_reduce(model_name, timeout=MODEL_TIMEOUT, workers=MAP_REDUCE_WORKERS,
+                         sizes=((5, 20), (20, 50), (80, 50), (200, 100))):
+    """
+    Print single-prompt and map-reduce latency for synthetic diffs of growing size.
+    This calls the real model, so it costs one request per size plus one per group.
+    """
+    import io
+
+    print(f"{'files':>6} {'diff chars':>11} {'groups':>7} {'single (s)':>11} {'map-reduce (s)':>15}")
+    for files, lines_per_file in sizes:
+        diff_text = synthetic_diff(files, lines_per_file)
+
+        started = time.monotonic()
+        try:
+            complete(model_name, build_prompt(COMMIT_MESSAGE_PROMPT, summarize_diff(diff_text)), timeout)
+            single = f"{time.monotonic() - started:.2f}"
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            single = "failed"
+            logging.getLogger("autocommit").error(f"Benchmark single prompt failed: {e}")
+
+        started = time.monotonic()
+        summaries = map_reduce_summaries(io.StringIO(diff_text), model_name, timeout, workers)
+        try:
+            complete(model_name, build_prompt(REDUCE_PROMPT, "\n\n".join(summaries)), timeout)
+            map_reduce = f"{time.monotonic() - started:.2f}"
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            map_reduce = "failed"
+            logging.getLogger("autocommit").error(f"Benchmark reduce step failed: {e}")
+
+        print(f"{files:>6} {len(diff_text):>11} {len(summaries):>7} {single:>11} {map_reduce:>15}")
+
+
+def run_model(model_name, prompt, results, processes, cancelled):
+    """Run one model for a race, reporting (model, message, latency, error) on the results queue."""
+    started = time.monotonic()
+    try:
+        process = subprocess.Popen(['gh', 'models', 'run', model_name],
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   text=True)
+    except FileNotFoundError as e:
+        results.put((model_name, None, time.monotonic() - started, str(e)))
+        return
+
+    processes[model_name] = process
+    if cancelled.is_set():
+        process.kill()
+    stdout, stderr = process.communicate(prompt)
+    latency = time.monotonic() - started
+    message = stdout.replace("```", "").strip()
+
+    if process.returncode == 0 and message:
+        results.put((model_name, message, latency, None))
+    else:
+        results.put((model_name, None, latency, stderr.strip() or f"exit code {process.returncode}"))
+
+
+def race_commit_message(system_prompt, git_diff_output, model_name, fallback_model, head_start=RACE_HEAD_START,
+                        timeout=MODEL_TIMEOUT):
+    """
+    Generate the commit message with the primary and fallback models racing.
+    The fallback starts after head_start seconds, or as soon as the primary
+    fails, and the first acceptable answer wins; the other process is killed.
+    Both models are given up on after timeout seconds.
+    """
+    logger = logging.getLogger("autocommit")
+    logger.info(f"Racing {model_name} against {fallback_model} with a {head_start}s head start")
+
+    prompt = build_prompt(system_prompt, git_diff_output)
+    results = queue.Queue()
+    processes = {}
+    cancelled = threading.Event()
+    pending = {model_name}
+    message = None
+
+    def start(name):
+        threading.Thread(target=run_model, args=(name, prompt, results, processes, cancelled), daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    stop_spinner = show_spinner("Generating commit message ")
+    try:
+        start(model_name)
+        fallback_started = False
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.error(f"No model answered within {timeout}s")
+                break
+            try:
+                wait = remaining if fallback_started else min(head_start, remaining)
+                name, message, latency, error = results.get(timeout=wait)
+            except queue.Empty:
+                name = None
+
+            if name is not None:
+                pending.discard(name)
+                if message:
+                    logger.info(f"Model {name} won the race in {latency:.2f}s")
+                    break
+                logger.error(f"Model {name} failed after {latency:.2f}s: {error}")
+
+            if not fallback_started and fallback_model and fallback_model != model_name:
+                fallback_started = True
+                pending.add(fallback_model)
+                start(fallback_model)
+    finally:
+        stop_spinner()
+        # The losing model's answer is no longer needed
+        cancelled.set()
+        for name in pending:
+            process = processes.get(name)
+            if process and process.poll() is None:
+                process.kill()
+                logger.info(f"Killed {name}, which lost the race")
+
+    if not message:
+        print("Error: no model produced a commit message.")
+    return message
+
+
 def edit_commit_message(commit_message):
     """Allow user to edit the generated commit message."""
+    import tempfile
+
     # Create a temporary file with the commit message
     with tempfile.NamedTemporaryFile(suffix=".tmp", mode='w+', delete=False) as temp:
         temp.write(commit_message)
@@ -282,56 +1232,577 @@ def get_user_confirmation_for_push():
         print("Please enter 'y' for yes or 'n' for no.")
 
 
+def prepare_message_request(args, env=None):
+    """
+    Read the staged changes and work out their message cache key
+    Returns: (cache_key, diff_summary), diff_summary being None in map-reduce
+    mode; None when nothing is staged
+    """
+    logger = logging.getLogger("autocommit")
+
+    if args.map_reduce:
+        # The diff is streamed later; the raw listing identifies the staged changes
+        staged_changes = get_staged_changes(env)
+        if not staged_changes:
+            return None
+        diff_summary = None
+        cache_prompt = build_prompt(REDUCE_PROMPT, staged_changes)
+    else:
+        # Get git diff
+        git_diff_output = get_git_diff(env)
+        if not git_diff_output:
+            return None
+
+        # Fit the diff into the model's budget instead of cutting it off blindly
+        diff_summary = summarize_diff(git_diff_output, args.diff_budget)
+        logger.info(f"Diff reduced from {len(git_diff_output)} to {len(diff_summary)} characters")
+        cache_prompt = build_prompt(COMMIT_MESSAGE_PROMPT, diff_summary)
+
+    # Identical staged changes get the message generated for them last time
+    tree = get_staged_tree(env)
+    cache_key = message_cache_key(tree, args.backend, args.model, cache_prompt) if tree else None
+    return cache_key, diff_summary
+
+
+def generate_commit_message(args, diff_summary, env=None):
+    """
+    Generate the commit message with the backend and mode selected by the
+    arguments. A remote backend that fails or takes longer than the latency
+    budget is replaced by the local one.
+    Returns: (message, name of the backend that produced it)
+    """
+    logger = logging.getLogger("autocommit")
+    started = time.monotonic()
+    message = None
+
+    if args.backend != "local":
+        timeout = args.timeout
+        deadline = None
+        if args.latency_budget:
+            timeout = min(timeout, args.latency_budget)
+            deadline = started + args.latency_budget
+
+        if args.map_reduce:
+            message = map_reduce_commit_message(
+                model_name=args.model,
+                fallback_model=args.fallback_model,
+                timeout=timeout,
+                workers=args.workers,
+                env=env,
+                deadline=deadline
+            )
+        elif args.race:
+            message = race_commit_message(
+                system_prompt=COMMIT_MESSAGE_PROMPT,
+                git_diff_output=diff_summary,
+                model_name=args.model,
+                fallback_model=args.fallback_model,
+                head_start=args.head_start,
+                timeout=timeout
+            )
+        else:
+            message = get_commit_message(
+                system_prompt=COMMIT_MESSAGE_PROMPT, 
+                git_diff_output=diff_summary,
+                model_name=args.model,
+                fallback_model=args.fallback_model,
+                timeout=timeout,
+                backend=args.backend,
+                deadline=deadline
+            )
+
+        if message or not args.latency_budget:
+            return message, args.backend
+        print("Remote model unavailable or over the latency budget; writing the message locally.")
+        logger.info(f"Falling back to the local backend after {time.monotonic() - started:.2f}s")
+
+    # The local backend reads the whole diff, not the budgeted summary
+    git_diff_output = get_git_diff(env)
+    if not git_diff_output:
+        return None, "local"
+    message = local_backend(COMMIT_MESSAGE_PROMPT, git_diff_output, args.model, args.timeout)
+    logger.info(f"Local backend answered in {time.monotonic() - started:.2f}s")
+    return message, "local"
+
+
+def get_co_changes(paths, commits=CO_CHANGE_COMMITS):
+    """
+    Count how often each pair of the given paths was committed together in
+    the recent history, read with a single git log
+    """
+    result = subprocess.run(['git', 'log', f'-n{commits}', '--name-only', '--format=%x00'],
+                            capture_output=True,
+                            text=True)
+    if result.returncode != 0:
+        return {}
+
+    wanted = set(paths)
+    counts = {}
+    for chunk in result.stdout.split('\0'):
+        changed = sorted(wanted.intersection(line for line in chunk.splitlines() if line))
+        for index, first in enumerate(changed):
+            for second in changed[index + 1:]:
+                counts[(first, second)] = counts.get((first, second), 0) + 1
+    return counts
+
+
+def group_staged_files(paths, co_changes, depth=SPLIT_DEPTH):
+    """
+    Cluster paths into logical groups: files under the same first `depth`
+    directories belong together, and so do files that are usually committed
+    together. Returns: lists of paths, in path order
+    """
+    parent = {path: path for path in paths}
+
+    def find(path):
+        while parent[path] != path:
+            parent[path] = parent[parent[path]]
+            path = parent[path]
+        return path
+
+    def union(first, second):
+        parent[find(first)] = find(second)
+
+    modules = {}
+    for path in paths:
+        module = "/".join(path.split('/')[:-1][:depth])
+        if module in modules:
+            union(path, modules[module])
+        else:
+            modules[module] = path
+
+    for (first, second), count in co_changes.items():
+        if count >= CO_CHANGE_MIN:
+            union(first, second)
+
+    groups = {}
+    for path in sorted(paths):
+        groups.setdefault(find(path), []).append(path)
+    return list(groups.values())
+
+
+def generate_group_message(args, group_diff):
+    """
+    Generate a message for one group without printing, so groups can be
+    generated concurrently
+    Returns: (message, latency in seconds)
+    """
+    logger = logging.getLogger("autocommit")
+    started = time.monotonic()
+    message = None
+
+    if args.backend != "local":
+        prompt = build_prompt(COMMIT_MESSAGE_PROMPT, summarize_diff(group_diff, args.diff_budget))
+        deadline = started + args.latency_budget if args.latency_budget else None
+        for model_name in dict.fromkeys(filter(None, [args.model, args.fallback_model])):
+            timeout = args.timeout if deadline is None else min(args.timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                break
+            try:
+                message = complete(model_name, prompt, timeout)
+                if message:
+                    break
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError) as e:
+                logger.error(f"Group message with {model_name} failed: {e}")
+
+    if not message and (args.backend == "local" or args.latency_budget):
+        message = local_backend(COMMIT_MESSAGE_PROMPT, group_diff, args.model, args.timeout)
+    return message, time.monotonic() - started
+
+
+def run_split(args):
+    """
+    Split the staged changes into logical groups, generate their messages
+    concurrently and offer to commit the groups one after another.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    logger = logging.getLogger("autocommit")
+
+    with timed_phase("git"):
+        git_diff_output = get_git_diff()
+        if not git_diff_output:
+            return
+
+        # Per-file diffs, and every path a file's commit has to name (renames have two)
+        file_diffs = {}
+        commit_paths = {}
+        for file_diff in iter_file_diffs(git_diff_output.splitlines(keepends=True)):
+            entry = parse_diff(file_diff)[0]
+            file_diffs[entry["path"]] = file_diff
+            commit_paths[entry["path"]] = [entry["path"]] + [
+                line[len('rename from '):] for line in entry["header"] if line.startswith('rename from')
+            ]
+
+        # git commit -- <paths> commits the work tree version of the paths, so
+        # unstaged edits to them would slip into the commits
+        unstaged = subprocess.run(['git', 'diff', '--name-only', '-z'],
+                                  capture_output=True, text=True, check=True).stdout.split('\0')
+        partially_staged = sorted(set(unstaged).intersection(file_diffs))
+        if partially_staged:
+            print("These files also have unstaged changes, which git commit -- <paths> would include:")
+            for path in partially_staged:
+                print(f"  {path}")
+            print("Stash or stage them first, or commit without --split.")
+            return
+
+        groups = group_staged_files(list(file_diffs), get_co_changes(list(file_diffs)))
+
+        # Diff paths are relative to the top level, but pathspecs to the cwd
+        toplevel = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
+                                  capture_output=True, text=True, check=True).stdout.strip()
+
+    if len(groups) == 1:
+        print("The staged changes form a single group; generating one message.")
+
+    print(f"Generating messages for {len(groups)} groups...")
+    started = time.monotonic()
+    with timed_phase("model"):
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(
+                lambda group: generate_group_message(args, "".join(file_diffs[path] for path in group)),
+                groups
+            ))
+    wall_time = time.monotonic() - started
+    sequential_time = sum(latency for _, latency in results)
+    print(f"Generated {len(groups)} messages in {wall_time:.2f}s (about {sequential_time:.2f}s one after another)")
+    logger.info(f"Split into {len(groups)} groups; messages in {wall_time:.2f}s, sequential {sequential_time:.2f}s")
+
+    committed = 0
+    for index, (group, (message, _)) in enumerate(zip(groups, results), start=1):
+        print(f"\nGroup {index}/{len(groups)}:")
+        for path in group:
+            print(f"  {path}")
+        if not message:
+            print("No message could be generated for this group; skipping it.")
+            logger.error(f"No message for group {index}")
+            continue
+
+        with timed_phase("edit"):
+            proceed, final_message = get_user_confirmation_for_commit(message)
+        if not proceed:
+            print("Group skipped; its changes stay staged.")
+            continue
+
+        paths = [commit_path for path in group for commit_path in commit_paths[path]]
+        with timed_phase("commit"):
+            subprocess.run(['git', 'commit', '-m', final_message, '--'] + paths, check=True, cwd=toplevel)
+        committed += 1
+        logger.info(f"Committed group {index} ({len(paths)} paths)")
+
+    print(f"\nCreated {committed} of {len(groups)} commits.")
+    return committed
+
+
+def worker_socket_path(toplevel):
+    """Unix socket of the warm worker serving the repository at toplevel."""
+    digest = hashlib.sha1(os.path.realpath(toplevel).encode('utf-8')).hexdigest()[:12]
+    return os.path.expanduser(f"~/.autocommit/worker-{digest}.sock")
+
+
+def get_index_path():
+    """Return the path of the repository's index file."""
+    result = subprocess.run(['git', 'rev-parse', '--git-path', 'index'],
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    return os.path.abspath(result.stdout.strip())
+
+
+def install_hook():
+    """Install the prepare-commit-msg hook running this script in the current repository."""
+    result = subprocess.run(['git', 'rev-parse', '--git-path', 'hooks/prepare-commit-msg'],
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    hook_path = result.stdout.strip()
+
+    if os.path.exists(hook_path):
+        with open(hook_path, 'r') as f:
+            if HOOK_MARKER not in f.read():
+                print(f"A different prepare-commit-msg hook already exists at {hook_path}; not replacing it.")
+                return False
+
+    os.makedirs(os.path.dirname(hook_path), exist_ok=True)
+    with open(hook_path, 'w') as f:
+        # Importing the module instead of running the script reuses its cached bytecode
+        f.write(f'#!/bin/sh\n{HOOK_MARKER}\n'
+                f'exec "{sys.executable}" -c \'import sys; sys.path.insert(0, sys.argv.pop(1)); '
+                f'import commit; commit.main()\' "{os.path.dirname(os.path.abspath(__file__))}" --hook "$@"\n')
+    os.chmod(hook_path, 0o755)
+    print(f"Installed prepare-commit-msg hook at {hook_path}")
+    return True
+
+
+def worker_message(args, generation_lock, env=None):
+    """
+    Return the message for the staged changes, generating it if needed.
+    Generations are serialised, so a request arriving while the message is
+    being generated waits for it instead of starting another model call.
+    """
+    request = prepare_message_request(args, env)
+    if not request:
+        return None
+    cache_key, diff_summary = request
+
+    message = read_cached_message(cache_key) if cache_key else None
+    if message:
+        return message
+
+    with generation_lock:
+        message = read_cached_message(cache_key) if cache_key else None
+        if not message:
+            message, backend = generate_commit_message(args, diff_summary, env)
+            cache_generated_message(args, cache_key, message, backend)
+    return message
+
+
+def serve_worker(args):
+    """
+    Run the warm worker for the current repository. It keeps the config and
+    modules loaded, pre-generates the message whenever the index changes, and
+    answers the prepare-commit-msg hook over a Unix socket.
+    """
+    import json
+    import socket
+
+    logger = logging.getLogger("autocommit")
+    toplevel = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    os.chdir(toplevel)
+    socket_path = worker_socket_path(toplevel)
+    index_path = get_index_path()
+    generation_lock = threading.Lock()
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    os.chmod(socket_path, 0o600)
+    server.listen()
+
+    def watch_index():
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.stat(index_path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime != last_mtime:
+                last_mtime = mtime
+                try:
+                    worker_message(args, generation_lock)
+                except Exception as e:
+                    logger.error(f"Worker pre-generation failed: {e}")
+            time.sleep(WORKER_POLL_INTERVAL)
+
+    def handle(connection):
+        with connection:
+            try:
+                request = json.loads(connection.makefile('r').readline() or '{}')
+                # git commit -a and commit with paths stage into a temporary index
+                env = None
+                if request.get("index_file"):
+                    env = {**os.environ, "GIT_INDEX_FILE": request["index_file"]}
+                message = worker_message(args, generation_lock, env)
+                connection.sendall((json.dumps({"message": message}) + "\n").encode('utf-8'))
+            except Exception as e:
+                logger.error(f"Worker request failed: {e}")
+
+    threading.Thread(target=watch_index, daemon=True).start()
+    print(f"Commit message worker for {toplevel} listening on {socket_path}")
+    logger.info(f"Worker started for {toplevel}")
+
+    try:
+        while True:
+            connection, _ = server.accept()
+            threading.Thread(target=handle, args=(connection,), daemon=True).start()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.unlink(socket_path)
+
+
+def request_worker_message(timeout=MODEL_TIMEOUT):
+    """Ask the warm worker for the message; None when no worker is running."""
+    import json
+    import socket
+
+    socket_path = worker_socket_path(os.getcwd())
+    if not os.path.exists(socket_path):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(socket_path)
+            request = {"index_file": os.environ.get("GIT_INDEX_FILE")}
+            client.sendall((json.dumps(request) + "\n").encode('utf-8'))
+            response = client.makefile('r').readline()
+        return json.loads(response).get("message") if response else None
+    except (OSError, ValueError) as e:
+        logging.getLogger("autocommit").warning(f"Worker unavailable: {e}")
+        return None
+
+
+def run_hook(args):
+    """
+    prepare-commit-msg hook: put the generated message in front of the
+    template git is about to open in the editor. Never fails the commit.
+    """
+    logger = logging.getLogger("autocommit")
+    started = time.monotonic()
+    message_file = args.hook[0]
+    source = args.hook[1] if len(args.hook) > 1 else ""
+
+    # -m, -F, merges, squashes and amends already come with a message
+    if source not in ("", "template"):
+        return
+
+    source_used = "worker"
+    try:
+        message = request_worker_message(args.timeout)
+        if not message:
+            source_used = "in-process"
+            request = prepare_message_request(args)
+            if not request:
+                return
+            cache_key, diff_summary = request
+            message = read_cached_message(cache_key) if cache_key else None
+            if message:
+                source_used = "cache"
+            else:
+                message, backend = generate_commit_message(args, diff_summary)
+                cache_generated_message(args, cache_key, message, backend)
+
+        if not message:
+            return
+
+        with open(message_file, 'r') as f:
+            template = f.read()
+        with open(message_file, 'w') as f:
+            f.write(f"{message}\n{template}")
+    except Exception as e:
+        logger.error(f"prepare-commit-msg hook failed: {e}")
+        return
+
+    # The hook runs between `git commit` and the editor opening, so this is
+    # the latency added to every commit
+    logger.info(f"prepare-commit-msg hook ready in {time.monotonic() - started:.2f}s ({source_used})")
+
+
 def main():
     """Main function."""
+    started = time.monotonic()
+    
     # Set up logging
     logger = setup_logging()
     logger.info("Auto Commit started")
     
     # Parse arguments
-    args = parse_arguments()
+    with timed_phase("config"):
+        args = parse_arguments()
+    
+    try:
+        run(args)
+    finally:
+        if args.stats:
+            report_phase_timings(time.monotonic() - started)
+
+
+def run(args):
+    """Run the command selected by the arguments."""
+    logger = logging.getLogger("autocommit")
     
     # Show config help if requested
     if hasattr(args, 'help_config') and args.help_config:
         show_help_config()
         return
     
-    # Check if we're in a git repo
-    if not check_git_repo():
-        logger.error("Not in a git repository")
+    if args.benchmark_map_reduce:
+        benchmark_map_reduce(args.model, args.timeout, args.workers)
         return
     
-    # Get git diff
-    git_diff_output = get_git_diff()
-    if not git_diff_output:
+    if args.hook:
+        run_hook(args)
+        return
+    
+    if args.install_hook or args.worker:
+        # Check if we're in a git repo
+        if not check_git_repo():
+            logger.error("Not in a git repository")
+            return
+        if args.install_hook:
+            install_hook()
+        else:
+            serve_worker(args)
+        return
+    
+    if args.split:
+        try:
+            committed = run_split(args)
+            if committed and not args.no_push:
+                with timed_phase("edit"):
+                    push = get_user_confirmation_for_push()
+                if push:
+                    with timed_phase("push"):
+                        subprocess.run(['git', 'push'], check=True)
+                    print("Changes pushed successfully!")
+                    logger.info("Push successful")
+        except subprocess.CalledProcessError as e:
+            print(f"Error during git operations: {e}")
+            print(f"Error output: {e.stderr}")
+            logger.error(f"Git operation error: {e.stderr}")
+        return
+    
+    # Read the staged changes; this also tells whether we are in a git repo
+    with timed_phase("git"):
+        request = prepare_message_request(args)
+    if not request:
         logger.info("No changes to commit")
         return
+    cache_key, diff_summary = request
 
     try:
-        # Generate commit message
-        commit_message = get_commit_message(
-            system_prompt=COMMIT_MESSAGE_PROMPT, 
-            git_diff_output=git_diff_output,
-            model_name=args.model
-        )
+        commit_message = None
+        if cache_key and not args.no_cache:
+            commit_message = read_cached_message(cache_key)
+            if commit_message:
+                print("Using cached commit message for the staged changes (--no-cache to regenerate).")
+                logger.info("Message cache hit")
 
         if not commit_message:
-            print("Failed to generate commit message. Aborting.")
-            logger.error("Failed to generate commit message")
-            return
+            # Generate commit message
+            with timed_phase("model"):
+                commit_message, backend = generate_commit_message(args, diff_summary)
+
+            if not commit_message:
+                print("Failed to generate commit message. Aborting.")
+                logger.error("Failed to generate commit message")
+                return
+
+            cache_generated_message(args, cache_key, commit_message, backend)
             
         # Ask for user confirmation
-        proceed, final_message = get_user_confirmation_for_commit(commit_message)
+        with timed_phase("edit"):
+            proceed, final_message = get_user_confirmation_for_commit(commit_message)
         
         if proceed:
             # Proceed with git commit
-            subprocess.run(['git', 'commit', '-m', final_message], check=True)
+            with timed_phase("commit"):
+                subprocess.run(['git', 'commit', '-m', final_message], check=True)
             print("Changes committed successfully!")
             logger.info("Commit successful")
             
             # Skip push prompt if --no-push was specified
-            if not args.no_push and get_user_confirmation_for_push():
-                subprocess.run(['git', 'push'], check=True)
+            push = False
+            if not args.no_push:
+                with timed_phase("edit"):
+                    push = get_user_confirmation_for_push()
+            if push:
+                with timed_phase("push"):
+                    subprocess.run(['git', 'push'], check=True)
                 print("Changes pushed successfully!")
                 logger.info("Push successful")
             elif not args.no_push:
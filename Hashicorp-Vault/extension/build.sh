@@ -0,0 +1,19 @@
+#!/bin/bash
+
+# Create layer directory; Lambda runs executables in /opt/extensions at init
+mkdir -p layer/extensions layer/vault-proxy
+
+# Copy the extension launcher and the proxy
+cp extensions/vault-proxy layer/extensions/
+cp vault_proxy.py layer/vault-proxy/
+chmod +x layer/extensions/vault-proxy
+
+# Create zip file
+cd layer
+zip -r ../vault_proxy_layer.zip .
+cd ..
+
+# Clean up
+rm -rf layer
+
+echo "Lambda layer created: vault_proxy_layer.zip"
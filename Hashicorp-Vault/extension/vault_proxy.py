@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Vault caching proxy - a small Vault Agent-style proxy for Lambda functions.
+
+The proxy authenticates with Vault once using the AWS IAM method, keeps the
+token renewed and serves Vault API requests on a localhost socket. Reads of
+secrets are cached until their lease is close to expiry, so functions get
+their secrets without a network round trip and without implementing the IAM
+login themselves. Requests that are not cached are forwarded to Vault with
+the proxy's token.
+
+It runs either as a Lambda external extension (when AWS_LAMBDA_RUNTIME_API is
+set) or as a standalone sidecar process. Only the standard library is used so
+the extension does not depend on the function's packages.
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import hmac
+import logging
+import threading
+import datetime
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("vault-proxy")
+
+EXTENSION_NAME = "vault-proxy"
+
+VAULT_ADDR = os.environ.get('VAULT_ADDR', 'http://127.0.0.1:8200')
+VAULT_ROLE = os.environ.get('VAULT_PROXY_ROLE', 'lambda-role')
+LISTEN_PORT = int(os.environ.get('VAULT_PROXY_PORT', '8100'))
+# Cached tokens and secrets are refreshed once they are this close (seconds) to expiry
+RENEW_THRESHOLD = int(os.environ.get('VAULT_PROXY_RENEW_THRESHOLD', '300'))
+REQUEST_TIMEOUT = float(os.environ.get('VAULT_PROXY_TIMEOUT', '10'))
+
+STS_BODY = "Action=GetCallerIdentity&Version=2011-06-15"
+
+
+class VaultProxyError(Exception):
+    """Raised when the proxy cannot authenticate or reach Vault"""
+    pass
+
+
+def sign_sts_request(access_key, secret_key, session_token, region='us-east-1'):
+    """
+    SigV4-sign an STS GetCallerIdentity request for Vault's AWS IAM login
+    Returns: headers of the signed request
+    """
+    now = datetime.datetime.utcnow()
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    date_stamp = now.strftime('%Y%m%d')
+
+    headers = {
+        'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8',
+        'Host': 'sts.amazonaws.com',
+        'X-Amz-Date': amz_date
+    }
+    if session_token:
+        headers['X-Amz-Security-Token'] = session_token
+
+    names = sorted(headers, key=str.lower)
+    canonical_headers = ''.join(f"{name.lower()}:{headers[name].strip()}\n" for name in names)
+    signed_headers = ';'.join(name.lower() for name in names)
+    canonical_request = '\n'.join([
+        'POST', '/', '', canonical_headers, signed_headers,
+        hashlib.sha256(STS_BODY.encode('utf-8')).hexdigest()
+    ])
+
+    scope = f"{date_stamp}/{region}/sts/aws4_request"
+    string_to_sign = '\n'.join([
+        'AWS4-HMAC-SHA256', amz_date, scope,
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    ])
+
+    key = ('AWS4' + secret_key).encode('utf-8')
+    for part in (date_stamp, region, 'sts', 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+    signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+    headers['Authorization'] = (
+        f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+        f"SignedHeaders={signed_headers}, Signature={signature}"
+    )
+    return headers
+
+
+def vault_call(method, path, token=None, payload=None):
+    """
+    Send a request to Vault
+    Returns: (status code, parsed JSON body or None)
+    """
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    request = urllib.request.Request(f"{VAULT_ADDR}{path}", data=data, method=method)
+    request.add_header('Content-Type', 'application/json')
+    if token:
+        request.add_header('X-Vault-Token', token)
+
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            body = response.read()
+            return response.status, json.loads(body) if body else None
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        try:
+            return e.code, json.loads(body) if body else None
+        except ValueError:
+            return e.code, {'errors': [body.decode('utf-8', 'replace')]}
+    except (urllib.error.URLError, OSError) as e:
+        raise VaultProxyError(f"Vault unreachable: {str(e)}")
+
+
+class TokenManager:
+    """Owns the proxy's Vault token: IAM login, renewal and re-login"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self._renewable = False
+
+    def token(self):
+        """Return a valid token, renewing or logging in when needed"""
+        with self._lock:
+            remaining = self._expires_at - time.time()
+            if self._token and remaining > RENEW_THRESHOLD:
+                return self._token
+            if self._token and remaining > 0 and self._renewable and self._renew():
+                return self._token
+            self._login()
+            return self._token
+
+    def invalidate(self):
+        """Drop the token, e.g. after Vault rejected it"""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+
+    def _store(self, auth):
+        self._token = auth['client_token']
+        self._expires_at = time.time() + auth.get('lease_duration', 0)
+        self._renewable = auth.get('renewable', False)
+
+    def _renew(self):
+        status, body = vault_call('POST', '/v1/auth/token/renew-self', token=self._token)
+        if status != 200 or body['auth'].get('lease_duration', 0) <= RENEW_THRESHOLD:
+            return False
+        self._store(body['auth'])
+        return True
+
+    def _login(self):
+        headers = sign_sts_request(
+            os.environ['AWS_ACCESS_KEY_ID'],
+            os.environ['AWS_SECRET_ACCESS_KEY'],
+            os.environ.get('AWS_SESSION_TOKEN')
+        )
+        payload = {
+            'role': VAULT_ROLE,
+            'iam_http_request_method': 'POST',
+            'iam_request_url': base64.b64encode(b'https://sts.amazonaws.com/').decode('utf-8'),
+            'iam_request_body': base64.b64encode(STS_BODY.encode('utf-8')).decode('utf-8'),
+            'iam_request_headers': base64.b64encode(json.dumps(headers).encode('utf-8')).decode('utf-8')
+        }
+        status, body = vault_call('POST', '/v1/auth/aws/login', payload=payload)
+        if status != 200:
+            raise VaultProxyError(f"Vault auth failed with status {status}: {body}")
+        self._store(body['auth'])
+        logger.info("Authenticated with Vault")
+
+
+class SecretCache:
+    """Caches GET responses of leased secrets until close to lease expiry"""
+
+    def __init__(self, tokens):
+        self._tokens = tokens
+        self._lock = threading.Lock()
+        self._path_locks = {}
+        self._entries = {}
+
+    def get(self, path):
+        """
+        Return (status, body) for a read, from cache when still fresh.
+        Concurrent reads of the same path share a single Vault request.
+        """
+        with self._lock:
+            path_lock = self._path_locks.setdefault(path, threading.Lock())
+
+        with path_lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                remaining = entry['expires_at'] - time.time()
+                if remaining > RENEW_THRESHOLD:
+                    return 200, self._with_remaining(entry['body'], remaining)
+                if remaining > 0 and entry['body'].get('renewable') and self._renew(entry):
+                    return 200, self._with_remaining(entry['body'], entry['expires_at'] - time.time())
+                del self._entries[path]
+
+            status, body = forward('GET', path, self._tokens)
+            lease_duration = (body or {}).get('lease_duration', 0)
+            if status == 200 and lease_duration > RENEW_THRESHOLD:
+                self._entries[path] = {'body': body, 'expires_at': time.time() + lease_duration}
+            return status, body
+
+    def lease_ids(self):
+        """Lease IDs of all cached secrets"""
+        with self._lock:
+            return [e['body']['lease_id'] for e in self._entries.values() if e['body'].get('lease_id')]
+
+    def _renew(self, entry):
+        status, body = forward('PUT', '/v1/sys/leases/renew', self._tokens,
+                               payload={'lease_id': entry['body']['lease_id']})
+        if status != 200 or body.get('lease_duration', 0) <= RENEW_THRESHOLD:
+            return False
+        entry['expires_at'] = time.time() + body['lease_duration']
+        return True
+
+    @staticmethod
+    def _with_remaining(body, remaining):
+        """Copy of a cached body whose lease_duration counts from now"""
+        return {**body, 'lease_duration': int(remaining)}
+
+
+def forward(method, path, tokens, payload=None):
+    """Send a request to Vault with the proxy's token, re-authenticating once on 403"""
+    status, body = vault_call(method, path, token=tokens.token(), payload=payload)
+    if status == 403:
+        tokens.invalidate()
+        status, body = vault_call(method, path, token=tokens.token(), payload=payload)
+    return status, body
+
+
+def make_handler(tokens, cache):
+    """Build the HTTP request handler class bound to the proxy's state"""
+
+    class ProxyHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self._handle(lambda: cache.get(self.path))
+
+        def do_POST(self):
+            self._handle(lambda: forward('POST', self.path, tokens, payload=self._payload()))
+
+        def do_PUT(self):
+            self._handle(lambda: forward('PUT', self.path, tokens, payload=self._payload()))
+
+        def _handle(self, call):
+            try:
+                status, body = call()
+            except VaultProxyError as e:
+                logger.error(str(e))
+                status, body = 502, {'errors': [str(e)]}
+            self._respond(status, body)
+
+        def _payload(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length)) if length else None
+
+        def _respond(self, status, body):
+            data = json.dumps(body).encode('utf-8') if body is not None else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return ProxyHandler
+
+
+def serve(tokens, cache):
+    """Start the proxy's HTTP server on a background thread"""
+    server = ThreadingHTTPServer(('127.0.0.1', LISTEN_PORT), make_handler(tokens, cache))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='vault-proxy-http', daemon=True).start()
+    logger.info(f"Vault proxy listening on 127.0.0.1:{LISTEN_PORT}")
+    return server
+
+
+def revoke_leases(tokens, cache):
+    """Revoke cached leases so Vault drops the credentials immediately"""
+    for lease_id in cache.lease_ids():
+        try:
+            forward('PUT', f"/v1/sys/leases/revoke/{lease_id}", tokens)
+            logger.info(f"Revoked lease: {lease_id}")
+        except VaultProxyError as e:
+            logger.warning(f"Could not revoke lease {lease_id}: {str(e)}")
+
+
+def run_extension(tokens, cache):
+    """Register with the Lambda Extensions API and follow the lifecycle until shutdown"""
+    api = f"http://{os.environ['AWS_LAMBDA_RUNTIME_API']}/2020-01-01/extension"
+
+    request = urllib.request.Request(
+        f"{api}/register",
+        data=json.dumps({'events': ['INVOKE', 'SHUTDOWN']}).encode('utf-8'),
+        headers={'Lambda-Extension-Name': EXTENSION_NAME},
+        method='POST'
+    )
+    with urllib.request.urlopen(request) as response:
+        extension_id = response.headers['Lambda-Extension-Identifier']
+
+    # The server must be listening before init completes, i.e. before the first event/next
+    serve(tokens, cache)
+
+    while True:
+        request = urllib.request.Request(
+            f"{api}/event/next",
+            headers={'Lambda-Extension-Identifier': extension_id}
+        )
+        with urllib.request.urlopen(request) as response:
+            event = json.loads(response.read())
+
+        if event.get('eventType') == 'SHUTDOWN':
+            revoke_leases(tokens, cache)
+            return
+
+
+def main():
+    """Run as a Lambda extension when inside Lambda, as a sidecar otherwise"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"[{EXTENSION_NAME}] %(asctime)s - %(levelname)s - %(message)s"
+    )
+    tokens = TokenManager()
+    cache = SecretCache(tokens)
+
+    if os.environ.get('AWS_LAMBDA_RUNTIME_API'):
+        run_extension(tokens, cache)
+        return 0
+
+    server = serve(tokens, cache)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        revoke_leases(tokens, cache)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
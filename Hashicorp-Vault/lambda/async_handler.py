@@ -0,0 +1,158 @@
+"""
+Concurrent SQS batch handler for the Vault Lambda.
+
+Set the function handler to async_handler.lambda_handler to process the
+records of an SQS batch concurrently over a small aiomysql pool instead of the
+single multi-row INSERT done by lambda_function.sqs_batch_handler. Each
+record is inserted in its own transaction, so a failing record only fails
+itself. Vault authentication, credential caching/renewal and schema checks
+are shared with lambda_function; they happen at most once per batch and are
+cached across warm invocations. Other events, such as API requests, are
+handled by lambda_function.lambda_handler.
+"""
+
+import os
+import asyncio
+import logging
+import aiomysql
+
+import lambda_function
+import migrations
+
+logger = logging.getLogger()
+
+# Records processed at once, and MySQL connections shared by them
+ASYNC_CONCURRENCY = int(os.environ.get('ASYNC_CONCURRENCY', '8'))
+ASYNC_POOL_SIZE = int(os.environ.get('ASYNC_POOL_SIZE', '4'))
+
+# One event loop for the container so the pool survives across invocations
+_loop = asyncio.new_event_loop()
+
+# aiomysql pool tied to the database user it was created for
+_pool = {
+    'pool': None,
+    'username': None
+}
+
+async def get_pool(db_creds):
+    """
+    Return the connection pool for the given credentials, replacing it after
+    credential rotation
+    """
+    if _pool['pool'] is not None and _pool['username'] == db_creds['username']:
+        return _pool['pool']
+
+    if _pool['pool'] is not None:
+        _pool['pool'].close()
+        await _pool['pool'].wait_closed()
+
+    logger.info(f"Creating MySQL pool for user: {db_creds['username']}")
+    _pool['pool'] = await aiomysql.create_pool(
+        host=os.environ['RDS_ENDPOINT'],
+        port=3306,
+        user=db_creds['username'],
+        password=db_creds['password'],
+        db=os.environ['DATABASE_NAME'],
+        connect_timeout=10,
+        minsize=1,
+        maxsize=ASYNC_POOL_SIZE,
+        pool_recycle=3600
+    )
+    _pool['username'] = db_creds['username']
+    return _pool['pool']
+
+async def insert_record(pool, semaphore, row):
+    """Insert one log row in its own transaction"""
+    async with semaphore:
+        async with pool.acquire() as connection:
+            try:
+                async with connection.cursor() as cursor:
+                    await cursor.execute("""
+                        INSERT INTO logs (message, source_ip, user_agent)
+                        VALUES (%s, %s, %s)
+                    """, row)
+                await connection.commit()
+            except Exception:
+                await connection.rollback()
+                raise
+
+async def add_to_counter(pool, inserted):
+    """
+    Add the rows inserted by a batch to logs_counter in one short
+    transaction, so the concurrent inserts do not queue on its row lock
+    """
+    async with pool.acquire() as connection:
+        try:
+            async with connection.cursor() as cursor:
+                await cursor.execute("UPDATE logs_counter SET total = total + %s WHERE id = 1", (inserted,))
+            await connection.commit()
+        except Exception:
+            await connection.rollback()
+            raise
+
+async def process_batch(records):
+    """
+    Insert the records of a batch concurrently
+    Returns: message IDs of the records that failed
+    """
+    failures = []
+    rows = {}
+
+    for record in records:
+        try:
+            rows[record['messageId']] = lambda_function.parse_sqs_record(record)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid record {record.get('messageId')}: {str(e)}")
+            failures.append(record.get('messageId'))
+
+    if not rows:
+        return failures
+
+    # Token, credentials and schema checks are cached, so this is cheap when warm;
+    # the inserts go through the pool, so no synchronous connection is kept open
+    db_creds = await asyncio.to_thread(lambda_function.prepare_credentials)
+    schema_version = await asyncio.to_thread(lambda_function.ensure_schema_once, db_creds)
+    pool = await get_pool(db_creds)
+    semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+
+    message_ids = list(rows)
+    results = await asyncio.gather(
+        *(insert_record(pool, semaphore, rows[message_id]) for message_id in message_ids),
+        return_exceptions=True
+    )
+
+    for message_id, result in zip(message_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to insert record {message_id}: {str(result)}")
+            failures.append(message_id)
+
+    inserted = sum(1 for result in results if not isinstance(result, Exception))
+    if inserted and schema_version >= migrations.COUNTER_VERSION:
+        try:
+            await add_to_counter(pool, inserted)
+        except Exception as e:
+            # The rows are committed, so retrying the records would duplicate them;
+            # the counter drifts, while ?count=exact still reports the true total
+            logger.error(f"Failed to add {inserted} rows to logs_counter: {str(e)}")
+
+    logger.info(f"Inserted {inserted} of {len(records)} records concurrently")
+    return failures
+
+def lambda_handler(event, context):
+    """
+    SQS batch handler; returns the partial batch response format
+    (requires ReportBatchItemFailures). API requests are passed on to
+    lambda_function.lambda_handler.
+    """
+    if not (event.get('Records') and event['Records'][0].get('eventSource') == 'aws:sqs'):
+        return lambda_function.lambda_handler(event, context)
+
+    records = event['Records']
+
+    try:
+        failures = _loop.run_until_complete(process_batch(records))
+    except Exception as e:
+        logger.error(f"Batch processing failed: {str(e)}", exc_info=True)
+        failures = [record['messageId'] for record in records]
+
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
@@ -1,20 +1,76 @@
 #!/bin/bash
+# Build a slim, reproducible Lambda package:
+# - skips packages the Lambda Python runtime already provides (boto3/botocore)
+# - strips tests, docs, type stubs and dist-info metadata
+# - precompiles bytecode for the target runtime so cold starts skip compilation
+# - reports the zip size and an import-time profile, appended to build-history.csv
+set -euo pipefail
+
+cd "$(dirname "$0")"
+
+TARGET_PYTHON="${TARGET_PYTHON:-3.9}"
+PYTHON="${PYTHON:-python${TARGET_PYTHON}}"
+PACKAGE_DIR=package
+ZIP_FILE=lambda_function.zip
+
+# Precompiled bytecode is only used by the matching interpreter version
+if ! command -v "$PYTHON" > /dev/null 2>&1; then
+    echo "Warning: $PYTHON not found; packaging without precompiled bytecode"
+    PYTHON=""
+fi
 
 # Create package directory
-mkdir -p package
+rm -rf "$PACKAGE_DIR" "$ZIP_FILE"
+mkdir -p "$PACKAGE_DIR"
 
-# Install dependencies
-pip install -r requirements.txt -t package/
+# Install dependencies for the target runtime, excluding runtime-provided packages
+grep -v -i -E '^(boto3|botocore)([=<>~! ]|$)' requirements.txt > "$PACKAGE_DIR/.requirements.txt"
+pip install -r "$PACKAGE_DIR/.requirements.txt" -t "$PACKAGE_DIR/" \
+    --python-version "$TARGET_PYTHON" --implementation cp \
+    --platform manylinux2014_x86_64 --only-binary=:all: \
+    --no-compile --quiet
+rm "$PACKAGE_DIR/.requirements.txt"
 
-# Copy lambda function
-cp lambda_function.py package/
+# Copy lambda function and its local modules
+cp lambda_function.py async_handler.py migrations.py partitions.py "$PACKAGE_DIR/"
 
-# Create zip file
-cd package
-zip -r ../lambda_function.zip .
-cd ..
+# Strip files that are never imported at runtime
+find "$PACKAGE_DIR" -depth -type d \( -name tests -o -name test -o -name docs -o -name __pycache__ -o -name '*.dist-info' \) \
+    -exec rm -rf {} +
+find "$PACKAGE_DIR" -type f \( -name '*.pyi' -o -name '*.md' -o -name '*.rst' \) -delete
 
-# Clean up
-rm -rf package
+# Precompile with hash-based pycs so the bytecode stays valid regardless of file mtimes
+if [ -n "$PYTHON" ]; then
+    "$PYTHON" -m compileall -q -j 0 --invalidation-mode unchecked-hash "$PACKAGE_DIR"
+fi
+
+# Create a reproducible zip: fixed timestamps, sorted entries, no extra attributes
+find "$PACKAGE_DIR" -exec touch -h -d '1980-01-02 00:00:00' {} +
+(cd "$PACKAGE_DIR" && find . -type f | LC_ALL=C sort | zip -X -q "../$ZIP_FILE" -@)
 
-echo "Lambda package created: lambda_function.zip"
\ No newline at end of file
+# Report package size and the import-time profile of the handler module
+ZIP_BYTES=$(wc -c < "$ZIP_FILE")
+echo "Lambda package created: $ZIP_FILE ($ZIP_BYTES bytes)"
+
+IMPORT_US=""
+if [ -n "$PYTHON" ]; then
+    if (cd "$PACKAGE_DIR" && VAULT_BACKGROUND_REFRESH=false "$PYTHON" -X importtime -c 'import lambda_function') \
+            2> importtime.log; then
+        # Largest cumulative times first; the lambda_function line is the total
+        sort -t '|' -k 2 -n -r importtime.log | head -n 15
+        IMPORT_US=$(grep -E '\| lambda_function$' importtime.log | awk -F '|' '{gsub(/ /, "", $2); print $2}')
+        echo "lambda_function import time: ${IMPORT_US} us (full profile in importtime.log)"
+    else
+        echo "Warning: import-time profile failed, see importtime.log"
+    fi
+fi
+
+# Keep a history so package size and import time can be tracked over time
+if [ ! -f build-history.csv ]; then
+    echo "timestamp,git_commit,zip_bytes,import_us" > build-history.csv
+fi
+echo "$(date -u +%Y-%m-%dT%H:%M:%SZ),$(git rev-parse --short HEAD 2>/dev/null || echo unknown),$ZIP_BYTES,$IMPORT_US" \
+    >> build-history.csv
+
+# Clean up
+rm -rf "$PACKAGE_DIR"
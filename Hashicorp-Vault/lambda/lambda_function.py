@@ -1,13 +1,20 @@
-import boto3
 import requests
 import pymysql
 import os
+import sys
 import json
 import base64
+import datetime
 import logging
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
-from botocore.credentials import ReadOnlyCredentials
+import time
+import signal
+import contextlib
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import migrations
+import partitions
 
 # Configure logging
 logger = logging.getLogger()
@@ -21,11 +28,307 @@ class DatabaseConnectionError(Exception):
     """Custom exception for database connection failures"""
     pass
 
-def get_vault_token():
+class InvalidRequestError(Exception):
+    """Custom exception for malformed request parameters"""
+    pass
+
+# Renew the cached Vault token once it is this close (seconds) to expiry
+TOKEN_RENEW_THRESHOLD = int(os.environ.get('VAULT_TOKEN_RENEW_THRESHOLD', '300'))
+
+# Renew the cached database lease once it is this close (seconds) to expiry
+LEASE_RENEW_THRESHOLD = int(os.environ.get('DB_LEASE_RENEW_THRESHOLD', '300'))
+
+# 'dynamic' issues a new MySQL user per lease from database/creds/lambda-role;
+# 'static' reads the Vault-rotated account from database/static-creds/<DB_STATIC_ROLE>
+DB_CREDENTIALS_MODE = os.environ.get('DB_CREDENTIALS_MODE', 'dynamic').lower()
+DB_STATIC_ROLE = os.environ.get('DB_STATIC_ROLE', 'lambda-static-role')
+
+# Static credentials are re-read this many seconds after Vault's scheduled rotation
+STATIC_ROTATION_GRACE = 5
+
+# Vault HTTP client tuning: (connect, read) timeouts, pool size and retries on 429/503
+VAULT_TIMEOUT = (
+    float(os.environ.get('VAULT_CONNECT_TIMEOUT', '3')),
+    float(os.environ.get('VAULT_READ_TIMEOUT', '10'))
+)
+VAULT_POOL_SIZE = int(os.environ.get('VAULT_POOL_SIZE', '4'))
+VAULT_MAX_RETRIES = int(os.environ.get('VAULT_MAX_RETRIES', '3'))
+
+# Background refresh: renew token/lease this many seconds before expiry (ahead of
+# the request-path thresholds above), checking every REFRESH_INTERVAL seconds
+BACKGROUND_REFRESH = os.environ.get('VAULT_BACKGROUND_REFRESH', 'true').lower() == 'true'
+REFRESH_LEAD = int(os.environ.get('VAULT_REFRESH_LEAD', '900'))
+REFRESH_INTERVAL = int(os.environ.get('VAULT_REFRESH_INTERVAL', '30'))
+
+# Guards the token and credential caches shared with the refresher thread
+_cache_lock = threading.Lock()
+_refresher_stop = threading.Event()
+
+# When set (e.g. http://127.0.0.1:8100), Vault calls go through the local caching
+# proxy extension, which authenticates on the function's behalf
+VAULT_PROXY_ADDR = os.environ.get('VAULT_PROXY_ADDR')
+
+# Months of logs kept by the scheduled partition maintenance
+LOG_RETENTION_MONTHS = int(os.environ.get('LOG_RETENTION_MONTHS', '12'))
+
+# Vault role issuing short-lived credentials with the DDL privileges maintenance needs
+MAINTENANCE_DB_ROLE = os.environ.get('MAINTENANCE_DB_ROLE', 'maintenance-role')
+
+# Vault AWS auth role logged in to; the maintenance function uses its own role,
+# so tokens serving requests cannot read DDL-capable credentials
+VAULT_AUTH_ROLE = os.environ.get('VAULT_AUTH_ROLE', 'lambda-role')
+
+# Page size limits of the logs read API
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Per-phase timings are emitted as CloudWatch EMF metrics and a Server-Timing header
+PHASE_TIMING = os.environ.get('PHASE_TIMING', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'VaultLambda')
+
+# Keep-alive session shared by all Vault calls; created on first use
+_vault_session = None
+
+# Vault token cached at module scope so warm invocations skip the IAM login
+_vault_token = {
+    'client_token': None,
+    'expires_at': 0.0,
+    'renewable': False
+}
+
+# Dynamic database credentials and their lease, reused until close to expiry
+_db_credentials = {
+    'data': None,
+    'lease_id': None,
+    'expires_at': 0.0,
+    'renewable': False
+}
+
+# MySQL connection kept open across warm invocations, tied to the user it was opened with.
+# 'prepared' holds a (username, connection) pair opened by the refresher for new credentials.
+_db_connection = {
+    'connection': None,
+    'username': None,
+    'prepared': None
+}
+
+# Schema version seen by this container; None until checked/migrated once
+_schema_version = None
+
+# Per-container counters used to report the connection reuse ratio
+_connection_stats = {
+    'reused': 0,
+    'opened': 0
+}
+
+class _TimedPhase:
+    """Context manager recording the duration of one phase in milliseconds"""
+    __slots__ = ('durations', 'name', 'start')
+    
+    def __init__(self, durations, name):
+        self.durations = durations
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+    
+    def __exit__(self, *exc):
+        self.durations[self.name] = (time.perf_counter() - self.start) * 1000
+        return False
+
+_NO_PHASE = contextlib.nullcontext()
+
+class PhaseTimer:
+    """
+    Records how long each phase of an invocation takes. A disabled timer
+    hands out a shared no-op context manager, so instrumentation costs next
+    to nothing when PHASE_TIMING is off.
+    """
+    
+    def __init__(self, enabled=PHASE_TIMING):
+        self.enabled = enabled
+        self.durations = {}
+    
+    def phase(self, name):
+        # Work done by the refresher thread is not part of the invocation
+        if not self.enabled or threading.current_thread() is not threading.main_thread():
+            return _NO_PHASE
+        return _TimedPhase(self.durations, name)
+    
+    def server_timing(self):
+        """Durations formatted as a Server-Timing header value"""
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in self.durations.items())
+    
+    def emit(self, context, handler):
+        """Print the durations as one CloudWatch Embedded Metric Format log line"""
+        if not self.enabled or not self.durations:
+            return
+        
+        metrics = {f"{name}_ms": round(duration, 3) for name, duration in self.durations.items()}
+        print(json.dumps({
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['FunctionName', 'Handler']],
+                    'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in metrics]
+                }]
+            },
+            'FunctionName': getattr(context, 'function_name', 'local'),
+            'Handler': handler,
+            'message': 'phase timings',
+            **metrics
+        }))
+
+# Timer of the invocation in progress
+_timer = PhaseTimer(enabled=False)
+
+def phase(name):
+    """Time a block as the named phase of the current invocation"""
+    return _timer.phase(name)
+
+def get_vault_session():
+    """
+    Return the shared keep-alive session for Vault API calls, so warm
+    invocations reuse the TCP/TLS connection instead of opening a new one
+    """
+    global _vault_session
+    if _vault_session is None:
+        # Logins and database/creds reads issue new tokens and users, so only
+        # retry when Vault cannot have handled the request: connection errors
+        # and 429/503 (rate limited, sealed or standby). Read errors and other
+        # 5xx responses may follow a processed request and are not retried.
+        retry = Retry(
+            total=VAULT_MAX_RETRIES,
+            read=0,
+            backoff_factor=0.2,
+            status_forcelist=(429, 503),
+            allowed_methods=frozenset(['GET', 'POST', 'PUT']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=VAULT_POOL_SIZE, max_retries=retry)
+        _vault_session = requests.Session()
+        _vault_session.mount('http://', adapter)
+        _vault_session.mount('https://', adapter)
+    return _vault_session
+
+def vault_request(method, path, token=None, timeout=None, **kwargs):
+    """
+    Send a request to the Vault API over the shared session and log its
+    round-trip latency together with the session's connection reuse
+    """
+    session = get_vault_session()
+    headers = {'X-Vault-Token': token} if token else {}
+    response = session.request(
+        method,
+        f"{VAULT_PROXY_ADDR or os.environ['VAULT_ADDR']}{path}",
+        headers=headers,
+        timeout=timeout or VAULT_TIMEOUT,
+        **kwargs
+    )
+    
+    requests_sent, connections_opened = _vault_pool_stats(session)
+    logger.info(
+        f"Vault {method} {path}: {response.status_code} in {response.elapsed.total_seconds() * 1000:.1f} ms "
+        f"(requests={requests_sent} connections={connections_opened})"
+    )
+    return response
+
+def _vault_pool_stats(session):
+    """Return (requests sent, connections opened) across the session's pools"""
+    requests_sent = 0
+    connections_opened = 0
+    for adapter in set(session.adapters.values()):
+        for key in adapter.poolmanager.pools.keys():
+            pool = adapter.poolmanager.pools[key]
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+    return requests_sent, connections_opened
+
+def _cache_vault_token(auth):
+    """
+    Store the 'auth' block of a Vault login/renew response in the token cache
+    """
+    _vault_token['client_token'] = auth['client_token']
+    _vault_token['expires_at'] = time.time() + auth.get('lease_duration', 0)
+    _vault_token['renewable'] = auth.get('renewable', False)
+
+def _clear_vault_token():
+    """Forget the cached Vault token"""
+    _vault_token['client_token'] = None
+    _vault_token['expires_at'] = 0.0
+    _vault_token['renewable'] = False
+
+def _renew_vault_token(renew_threshold):
+    """
+    Extend the cached token via renew-self
+    Returns: True if the token was renewed, False otherwise
+    """
+    try:
+        renew_response = vault_request(
+            'POST',
+            "/v1/auth/token/renew-self",
+            token=_vault_token['client_token']
+        )
+        
+        if renew_response.status_code != 200:
+            logger.warning(f"Vault token renewal failed: {renew_response.status_code} - {renew_response.text}")
+            return False
+        
+        auth = renew_response.json()['auth']
+        # Vault caps renewals at the token's max TTL; a short grant means re-login soon
+        if auth.get('lease_duration', 0) <= renew_threshold:
+            logger.info("Vault token is at its max TTL, re-authenticating")
+            return False
+        
+        _cache_vault_token(auth)
+        return True
+        
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Network error renewing Vault token: {str(e)}")
+        return False
+
+def get_vault_token(renew_threshold=TOKEN_RENEW_THRESHOLD):
+    """
+    Return a valid Vault token, reusing the one cached by a previous invocation.
+    The cached token is renewed when within renew_threshold seconds of expiry
+    and a fresh IAM login is only performed when there is no token or renewal fails.
+    Returns: Vault token string, or None when the local proxy authenticates
+    """
+    if VAULT_PROXY_ADDR:
+        return None
+    
+    start = time.perf_counter()
+    
+    with _cache_lock:
+        remaining = _vault_token['expires_at'] - time.time()
+        
+        if _vault_token['client_token'] and remaining > renew_threshold:
+            source = 'cached'
+        elif (_vault_token['client_token'] and remaining > 0 and _vault_token['renewable']
+                and _renew_vault_token(renew_threshold)):
+            source = 'renewed'
+        else:
+            _clear_vault_token()
+            _cache_vault_token(login_to_vault())
+            source = 'login'
+        
+        token = _vault_token['client_token']
+    
+    logger.info(f"Vault auth phase: {source} token in {(time.perf_counter() - start) * 1000:.1f} ms")
+    return token
+
+def login_to_vault():
     """
     Authenticate with Vault using AWS IAM method
-    Returns: Vault token string
+    Returns: 'auth' block of the Vault login response
     """
+    # Imported lazily: boto3/botocore dominate import time and are only
+    # needed for the occasional IAM login, never when using the proxy
+    import boto3
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+    
     try:
         # Get AWS credentials from Lambda execution role
         session = boto3.Session()
@@ -49,12 +352,13 @@ def get_vault_token():
         )
         
         # Sign the request
-        sigv4 = SigV4Auth(frozen_creds, "sts", "us-east-1")
-        sigv4.add_auth(request)
+        with phase('sts_sign'):
+            sigv4 = SigV4Auth(frozen_creds, "sts", "us-east-1")
+            sigv4.add_auth(request)
         
         # Prepare the Vault login request
         iam_request = {
-            "role": "lambda-role",
+            "role": VAULT_AUTH_ROLE,
             "iam_http_request_method": request.method,
             "iam_request_url": base64.b64encode(request.url.encode('utf-8')).decode('utf-8'),
             "iam_request_body": base64.b64encode(request.body).decode('utf-8') if request.body else "",
@@ -66,10 +370,10 @@ def get_vault_token():
         vault_addr = os.environ['VAULT_ADDR']
         logger.info(f"Authenticating with Vault at: {vault_addr}")
         
-        auth_response = requests.post(
-            f"{vault_addr}/v1/auth/aws/login",
-            json=iam_request,
-            timeout=10
+        auth_response = vault_request(
+            'POST',
+            "/v1/auth/aws/login",
+            json=iam_request
         )
         
         if auth_response.status_code != 200:
@@ -77,118 +381,660 @@ def get_vault_token():
             raise VaultAuthError(f"Vault auth failed with status {auth_response.status_code}")
         
         response_data = auth_response.json()
-        return response_data['auth']['client_token']
+        return response_data['auth']
         
     except Exception as e:
         logger.error(f"Error during Vault authentication: {str(e)}")
         raise VaultAuthError(f"Authentication error: {str(e)}")
 
-def get_database_credentials(vault_token):
+def _cache_db_credentials(secret):
     """
-    Retrieve dynamic database credentials from Vault
+    Store a Vault database secret (data plus lease information) in the cache.
+    Static credentials have no lease; they stay valid until the next rotation,
+    'ttl' seconds from now.
+    """
+    _db_credentials['data'] = secret['data']
+    _db_credentials['lease_id'] = secret.get('lease_id') or None
+    if _db_credentials['lease_id']:
+        _db_credentials['expires_at'] = time.time() + secret.get('lease_duration', 0)
+        _db_credentials['renewable'] = secret.get('renewable', False)
+    else:
+        _db_credentials['expires_at'] = time.time() + secret['data'].get('ttl', 0) + STATIC_ROTATION_GRACE
+        _db_credentials['renewable'] = False
+
+def _clear_db_credentials():
+    """Forget the cached database credentials"""
+    _db_credentials['data'] = None
+    _db_credentials['lease_id'] = None
+    _db_credentials['expires_at'] = 0.0
+    _db_credentials['renewable'] = False
+
+def _renew_db_lease(vault_token, renew_threshold):
+    """
+    Extend the lease of the cached database credentials
+    Returns: True if the lease was renewed, False otherwise
     """
     try:
-        vault_addr = os.environ['VAULT_ADDR']
-        headers = {'X-Vault-Token': vault_token}
+        renew_response = vault_request(
+            'PUT',
+            "/v1/sys/leases/renew",
+            token=vault_token,
+            json={'lease_id': _db_credentials['lease_id']}
+        )
         
-        logger.info("Requesting database credentials from Vault...")
+        if renew_response.status_code != 200:
+            logger.warning(f"Lease renewal failed: {renew_response.status_code} - {renew_response.text}")
+            return False
         
-        creds_response = requests.get(
-            f"{vault_addr}/v1/database/creds/lambda-role",
-            headers=headers,
-            timeout=10
+        lease_duration = renew_response.json().get('lease_duration', 0)
+        # The role's max TTL caps renewals; request new credentials instead
+        if lease_duration <= renew_threshold:
+            logger.info("Database lease is at its max TTL, requesting new credentials")
+            return False
+        
+        _db_credentials['expires_at'] = time.time() + lease_duration
+        return True
+        
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Network error renewing database lease: {str(e)}")
+        return False
+
+def revoke_db_credentials():
+    """
+    Revoke the lease of the cached database credentials so Vault drops the
+    MySQL user right away instead of waiting for the lease to expire
+    """
+    lease_id = _db_credentials['lease_id']
+    token = _vault_token['client_token']
+    close_db_connection()
+    prepared = _db_connection['prepared']
+    _db_connection['prepared'] = None
+    if prepared is not None:
+        _close_quietly(prepared[1])
+    _clear_db_credentials()
+    
+    # Through the proxy there is no token here; the proxy revokes its own leases on shutdown
+    if not lease_id or not token:
+        return
+    
+    revoke_lease(lease_id, token, timeout=2)
+
+def revoke_lease(lease_id, vault_token, timeout=None):
+    """Revoke a Vault lease, logging rather than raising on failure"""
+    try:
+        vault_request(
+            'PUT',
+            f"/v1/sys/leases/revoke/{lease_id}",
+            token=vault_token,
+            timeout=timeout
         )
+        logger.info(f"Revoked database lease: {lease_id}")
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not revoke database lease: {str(e)}")
+
+def _handle_sigterm(signum, frame):
+    """
+    Clean up on container shutdown. Lambda only delivers SIGTERM to the
+    runtime when an extension is attached to the function.
+    """
+    _refresher_stop.set()
+    revoke_db_credentials()
+    sys.exit(0)
+
+signal.signal(signal.SIGTERM, _handle_sigterm)
+
+def get_database_credentials(vault_token, renew_threshold=LEASE_RENEW_THRESHOLD):
+    """
+    Return database credentials, reusing the ones cached by a previous
+    invocation. The lease is renewed when within renew_threshold seconds of
+    expiry and new dynamic credentials are only requested when there are
+    none or renewal fails.
+    Static credentials cannot be renewed and are re-read once Vault has
+    rotated them.
+    """
+    with _cache_lock:
+        remaining = _db_credentials['expires_at'] - time.time()
+        if _db_credentials['data'] and not _db_credentials['lease_id']:
+            renew_threshold = 0
+        
+        if _db_credentials['data'] and remaining > renew_threshold:
+            return _db_credentials['data']
+        
+        if (_db_credentials['data'] and remaining > 0 and _db_credentials['renewable']
+                and _renew_db_lease(vault_token, renew_threshold)):
+            logger.info(f"Renewed database lease: {_db_credentials['lease_id']}")
+            return _db_credentials['data']
+        
+        _clear_db_credentials()
+        _cache_db_credentials(request_database_credentials(vault_token))
+        return _db_credentials['data']
+
+def request_database_credentials(vault_token, role=None):
+    """
+    Retrieve dynamic or static database credentials from Vault, depending on
+    DB_CREDENTIALS_MODE, or dynamic credentials of the given role
+    Returns: Vault secret including 'data' and lease information
+    """
+    if role:
+        path = f"/v1/database/creds/{role}"
+    elif DB_CREDENTIALS_MODE == 'static':
+        path = f"/v1/database/static-creds/{DB_STATIC_ROLE}"
+    else:
+        path = "/v1/database/creds/lambda-role"
+    
+    try:
+        logger.info(f"Requesting {role or DB_CREDENTIALS_MODE} database credentials from Vault...")
+        
+        creds_response = vault_request('GET', path, token=vault_token)
         
         if creds_response.status_code != 200:
             logger.error(f"Failed to get credentials: {creds_response.status_code} - {creds_response.text}")
             raise VaultAuthError("Failed to retrieve database credentials")
         
-        credentials = creds_response.json()['data']
-        logger.info(f"Retrieved credentials for user: {credentials['username']}")
+        secret = creds_response.json()
+        logger.info(f"Retrieved credentials for user: {secret['data']['username']}")
         
-        return credentials
+        return secret
         
     except requests.exceptions.RequestException as e:
         logger.error(f"Network error fetching credentials: {str(e)}")
         raise VaultAuthError(f"Credential fetch error: {str(e)}")
 
-def create_table_if_not_exists(connection):
+def _close_quietly(connection):
+    """Close a MySQL connection, ignoring errors from an already broken one"""
+    if connection is not None:
+        try:
+            connection.close()
+        except pymysql.Error:
+            pass
+
+def close_db_connection():
+    """Close and forget the cached MySQL connection"""
+    connection = _db_connection['connection']
+    _db_connection['connection'] = None
+    _db_connection['username'] = None
+    _close_quietly(connection)
+
+def open_db_connection(db_creds):
+    """Open a new MySQL connection with the given credentials"""
+    return pymysql.connect(
+        host=os.environ['RDS_ENDPOINT'],
+        port=3306,
+        user=db_creds['username'],
+        password=db_creds['password'],
+        database=os.environ['DATABASE_NAME'],
+        connect_timeout=10,
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+def get_db_connection(db_creds):
     """
-    Create the logs table if it doesn't exist
+    Return a MySQL connection for the given credentials, reusing the one
+    opened by a previous invocation when it is still alive and was opened
+    with the same user. A new connection is opened after credential rotation
+    or when the liveness check fails. A connection pre-opened by the
+    refresher for the current credentials is swapped in first.
     """
+    with _cache_lock:
+        prepared = _db_connection['prepared']
+        _db_connection['prepared'] = None
+    
+    if prepared is not None:
+        if prepared[0] == db_creds['username']:
+            close_db_connection()
+            _db_connection['connection'] = prepared[1]
+            _db_connection['username'] = prepared[0]
+            logger.info(f"Swapped in pre-opened connection for user: {prepared[0]}")
+        else:
+            _close_quietly(prepared[1])
+    
+    connection = _db_connection['connection']
+    
+    if connection is not None and _db_connection['username'] == db_creds['username']:
+        try:
+            connection.ping(reconnect=False)
+            _connection_stats['reused'] += 1
+            _log_connection_stats('reused')
+            return connection
+        except pymysql.Error as e:
+            logger.info(f"Cached connection is no longer usable: {str(e)}")
+    
+    close_db_connection()
+    
+    logger.info("Connecting to RDS...")
+    connection = open_db_connection(db_creds)
+    _db_connection['connection'] = connection
+    _db_connection['username'] = db_creds['username']
+    _connection_stats['opened'] += 1
+    _log_connection_stats('opened')
+    return connection
+
+def _log_connection_stats(outcome):
+    """Log whether the connection was reused and the container's reuse ratio"""
+    total = _connection_stats['reused'] + _connection_stats['opened']
+    logger.info(
+        f"DB connection {outcome}: reused={_connection_stats['reused']} "
+        f"opened={_connection_stats['opened']} reuse_ratio={_connection_stats['reused'] / total:.2f}"
+    )
+
+def refresh_credentials():
+    """
+    Renew the Vault token and database lease ahead of the request path and,
+    when new credentials were issued while a synchronous connection is in use,
+    pre-open a connection with them so the next invocation only has to swap it in
+    """
+    if _db_credentials['data'] is None:
+        # Nothing cached yet; the first invocation populates the caches
+        return
+    
+    previous_user = _db_credentials['data']['username']
+    vault_token = get_vault_token(REFRESH_LEAD)
+    db_creds = get_database_credentials(vault_token, REFRESH_LEAD)
+    
+    if db_creds['username'] == previous_user:
+        return
+    
+    if _db_connection['connection'] is None:
+        # No synchronous connection in use (e.g. the async handler's container)
+        return
+    
+    connection = open_db_connection(db_creds)
+    with _cache_lock:
+        stale = _db_connection['prepared']
+        _db_connection['prepared'] = (db_creds['username'], connection)
+    if stale is not None:
+        _close_quietly(stale[1])
+    logger.info(f"Pre-opened connection for rotated user: {db_creds['username']}")
+
+def _refresh_loop():
+    """
+    Body of the refresher thread. It only runs while the container is thawed,
+    so REFRESH_LEAD must leave room for gaps between invocations.
+    """
+    while not _refresher_stop.wait(REFRESH_INTERVAL):
+        try:
+            refresh_credentials()
+        except Exception as e:
+            logger.warning(f"Background credential refresh failed: {str(e)}")
+
+if BACKGROUND_REFRESH:
+    threading.Thread(target=_refresh_loop, name='vault-refresher', daemon=True).start()
+
+def ensure_schema(connection):
+    """
+    Bring the logs schema up to date once per container. Later invocations
+    skip the check entirely, so no DDL runs on the request path.
+    Returns: schema version in use
+    """
+    global _schema_version
+    if _schema_version is not None:
+        return _schema_version
+    
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS logs (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    message TEXT,
-                    source_ip VARCHAR(45),
-                    user_agent TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+        version = migrations.current_version(connection)
+        if version < migrations.LATEST_VERSION:
+            applied = migrations.apply_migrations(connection)
+            logger.info(f"Applied schema migrations: {applied}")
+            version = migrations.current_version(connection)
+        else:
+            logger.info(f"Schema is up to date at version {version}")
+    except pymysql.Error as e:
+        # Typically missing DDL privileges (run migrations.py offline instead) or
+        # another container holding the migration lock through a long ALTER
+        logger.warning(f"Could not apply schema migrations: {str(e)}")
+        try:
+            version = migrations.current_version(connection)
+        except pymysql.Error:
+            version = 0
+        if version < migrations.COUNTER_VERSION:
+            # Check again on the next invocation, so the container starts
+            # maintaining logs_counter as soon as the table exists
+            return version
+    finally:
+        end_read(connection)
+    
+    _schema_version = version
+    return _schema_version
+
+def insert_logs(connection, schema_version, rows):
+    """
+    Insert (message, source_ip, user_agent) rows in a single transaction and
+    return the total number of entries. executemany() sends the rows as one
+    multi-row INSERT. From schema version 2 the total is kept in logs_counter,
+    incremented in the same transaction, so no COUNT(*) scan is needed.
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany("""
+            INSERT INTO logs (message, source_ip, user_agent) 
+            VALUES (%s, %s, %s)
+        """, rows)
+        
+        if schema_version >= migrations.COUNTER_VERSION:
+            # LAST_INSERT_ID(expr) hands the new total back in the OK packet
+            cursor.execute(
+                "UPDATE logs_counter SET total = LAST_INSERT_ID(total + %s) WHERE id = 1",
+                (len(rows),)
+            )
             connection.commit()
-            logger.info("Verified/Created logs table")
+            return cursor.lastrowid
+        
+        connection.commit()
+    
+    return count_logs(connection)
+
+def count_logs(connection):
+    """
+    Exact count of log entries; scans the table, so only used on request
+    or before the counter migration is applied
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) as count FROM logs")
+            return cursor.fetchone()['count']
+    finally:
+        end_read(connection)
+
+def end_read(connection):
+    """
+    End the transaction a SELECT opened. Autocommit is off and the connection
+    outlives the invocation, so an open REPEATABLE READ snapshot would pin
+    later reads to it and hold back InnoDB purge.
+    """
+    connection.rollback()
+
+def _parse_timestamp(value, name):
+    """Validate an ISO-8601 timestamp query parameter and format it for MySQL"""
+    try:
+        parsed = datetime.datetime.fromisoformat(value.rstrip('Z'))
+    except ValueError:
+        raise InvalidRequestError(f"'{name}' must be an ISO-8601 timestamp")
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+def encode_cursor(row):
+    """Opaque pagination cursor pointing just after the given row"""
+    key = json.dumps([row['created_at'].strftime('%Y-%m-%d %H:%M:%S'), row['id']])
+    return base64.urlsafe_b64encode(key.encode('utf-8')).decode('utf-8')
+
+def decode_cursor(cursor):
+    """Return the (created_at, id) keyset position stored in a cursor"""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')))
+        return _parse_timestamp(created_at, 'cursor'), int(row_id)
+    except (ValueError, TypeError, InvalidRequestError):
+        raise InvalidRequestError("'cursor' is not a valid pagination cursor")
+
+def read_logs(connection, params):
+    """
+    Return one page of log entries ordered by (created_at, id).
+    Filters: 'from'/'to' (created_at range, to exclusive) and 'source_ip'.
+    Pages use keyset pagination: 'cursor' holds the last row's key, so deep
+    pages cost the same as the first. The inner query only touches the
+    (source_ip,) created_at, id indexes; full rows are joined in per page.
+    """
+    try:
+        limit = min(int(params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise InvalidRequestError("'limit' must be an integer")
+    if limit < 1:
+        raise InvalidRequestError("'limit' must be positive")
+    
+    conditions = []
+    args = []
+    if params.get('source_ip'):
+        conditions.append("source_ip = %s")
+        args.append(params['source_ip'])
+    if params.get('from'):
+        conditions.append("created_at >= %s")
+        args.append(_parse_timestamp(params['from'], 'from'))
+    if params.get('to'):
+        conditions.append("created_at < %s")
+        args.append(_parse_timestamp(params['to'], 'to'))
+    if params.get('cursor'):
+        created_at, row_id = decode_cursor(params['cursor'])
+        conditions.append("(created_at > %s OR (created_at = %s AND id > %s))")
+        args.extend([created_at, created_at, row_id])
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    try:
+        with connection.cursor() as cursor:
+            # Fetch one extra row to know whether another page exists; joining on
+            # the full primary key lets MySQL prune to one partition per row
+            cursor.execute(f"""
+                SELECT l.id, l.message, l.source_ip, l.user_agent, l.created_at
+                FROM logs l
+                JOIN (
+                    SELECT id, created_at FROM logs {where}
+                    ORDER BY created_at, id
+                    LIMIT %s
+                ) page ON page.id = l.id AND page.created_at = l.created_at
+                ORDER BY l.created_at, l.id
+            """, args + [limit + 1])
+            rows = cursor.fetchall()
+    finally:
+        end_read(connection)
+    
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {'items': rows[:limit], 'next_cursor': next_cursor}
+
+def prepare_credentials():
+    """
+    Run the Vault steps shared by both handlers
+    Returns: database credentials
+    """
+    # Step 1: Get Vault token using IAM authentication
+    logger.info("Authenticating with Vault...")
+    with phase('vault_auth'):
+        vault_token = get_vault_token()
+    
+    # Step 2: Retrieve dynamic database credentials
+    logger.info("Retrieving database credentials...")
+    with phase('db_credentials'):
+        return get_database_credentials(vault_token)
+
+def prepare_database():
+    """
+    Run the Vault and database setup steps of the synchronous handler
+    Returns: (connection, db_creds, schema_version)
+    """
+    db_creds = prepare_credentials()
+    
+    # Step 3: Connect to RDS using dynamic credentials (reused while warm)
+    with phase('db_connect'):
+        connection = get_db_connection(db_creds)
+    
+    # Step 4: Ensure schema is migrated (once per container)
+    with phase('schema'):
+        schema_version = ensure_schema(connection)
+    
+    return connection, db_creds, schema_version
+
+def ensure_schema_once(db_creds):
+    """
+    Schema check for callers without a cached connection, such as the async
+    handler. A short-lived connection is opened only on the first call in the
+    container; later calls return the cached version without touching MySQL.
+    Returns: schema version in use
+    """
+    if _schema_version is not None:
+        return _schema_version
+    
+    with phase('schema'):
+        connection = open_db_connection(db_creds)
+        try:
+            return ensure_schema(connection)
+        finally:
+            _close_quietly(connection)
+
+def parse_sqs_record(record):
+    """
+    Turn an SQS record into a logs row. The body is either a JSON object with
+    message/source_ip/user_agent keys or plain text used as the message.
+    """
+    body = record['body']
+    try:
+        payload = json.loads(body)
+    except json.JSONDecodeError:
+        payload = None
+    
+    if not isinstance(payload, dict):
+        return (body, 'unknown', 'unknown')
+    
+    if 'message' not in payload:
+        raise ValueError("JSON body has no 'message'")
+    
+    return (
+        str(payload['message']),
+        payload.get('source_ip', 'unknown'),
+        payload.get('user_agent', 'unknown')
+    )
+
+def sqs_batch_handler(event, context):
+    """
+    Ingest an SQS batch with one multi-row INSERT and one commit.
+    Returns the partial batch response format, so only records listed in
+    batchItemFailures are retried (requires ReportBatchItemFailures).
+    """
+    global _timer
+    _timer = PhaseTimer()
+    try:
+        return _ingest_sqs_batch(event)
+    finally:
+        _timer.emit(context, 'sqs')
+
+def _ingest_sqs_batch(event):
+    """Parse and insert the records of an SQS batch, collecting per-record failures"""
+    records = event['Records']
+    failures = []
+    rows = []
+    row_ids = []
+    
+    for record in records:
+        try:
+            rows.append(parse_sqs_record(record))
+            row_ids.append(record['messageId'])
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid record {record.get('messageId')}: {str(e)}")
+            failures.append(record.get('messageId'))
+    
+    if not rows:
+        return {'batchItemFailures': [{'itemIdentifier': i} for i in failures]}
+    
+    try:
+        connection, _, schema_version = prepare_database()
     except Exception as e:
-        logger.warning(f"Could not create table: {str(e)}")
+        logger.error(f"Could not prepare database for batch: {str(e)}", exc_info=True)
+        close_db_connection()
+        return {'batchItemFailures': [{'itemIdentifier': r['messageId']} for r in records]}
+    
+    try:
+        with phase('insert'):
+            log_count = insert_logs(connection, schema_version, rows)
+        logger.info(f"Inserted {len(rows)} log entries in one transaction. Total log entries: {log_count}")
+    except pymysql.Error as e:
+        # Isolate the records that make the batch fail by inserting one by one
+        logger.warning(f"Batch insert failed, retrying records individually: {str(e)}")
+        try:
+            connection.rollback()
+            for row, message_id in zip(rows, row_ids):
+                try:
+                    insert_logs(connection, schema_version, [row])
+                except pymysql.Error as row_error:
+                    logger.error(f"Failed to insert record {message_id}: {str(row_error)}")
+                    connection.rollback()
+                    failures.append(message_id)
+        except pymysql.Error as conn_error:
+            logger.error(f"Database connection error: {str(conn_error)}")
+            close_db_connection()
+            return {'batchItemFailures': [{'itemIdentifier': r['messageId']} for r in records]}
+    
+    return {'batchItemFailures': [{'itemIdentifier': i} for i in failures]}
+
+def maintenance_handler(event, context):
+    """
+    Scheduled partition maintenance: create future monthly partitions and
+    drop the ones past LOG_RETENTION_MONTHS. Uses its own short-lived
+    credentials from MAINTENANCE_DB_ROLE, revoked as soon as it is done.
+    Runs as the handler of a separate function whose VAULT_AUTH_ROLE may
+    read MAINTENANCE_DB_ROLE; the request-serving function may not.
+    """
+    try:
+        vault_token = get_vault_token()
+        secret = request_database_credentials(vault_token, role=MAINTENANCE_DB_ROLE)
+        connection = open_db_connection(secret['data'])
+        try:
+            result = partitions.maintain_partitions(connection, LOG_RETENTION_MONTHS)
+        finally:
+            _close_quietly(connection)
+            revoke_lease(secret['lease_id'], vault_token)
+        
+        logger.info(f"Partition maintenance completed: {result}")
+        return {
+            'statusCode': 200,
+            'body': json.dumps(result)
+        }
+        
+    except (VaultAuthError, pymysql.Error) as e:
+        logger.error(f"Partition maintenance failed: {str(e)}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Partition maintenance failed', 'details': str(e)})
+        }
 
 def lambda_handler(event, context):
     """
     Main Lambda handler function
     """
+    if event.get('Records') and event['Records'][0].get('eventSource') == 'aws:sqs':
+        return sqs_batch_handler(event, context)
+    
+    global _timer
+    _timer = PhaseTimer()
+    try:
+        response = _handle_request(event)
+        if _timer.enabled:
+            response['headers'] = {'Server-Timing': _timer.server_timing()}
+        return response
+    finally:
+        _timer.emit(context, 'api')
+
+def _handle_request(event):
+    """Insert a log entry for an API request and report the total"""
     try:
         logger.info("Lambda function started")
         
-        # Step 1: Get Vault token using IAM authentication
-        logger.info("Authenticating with Vault...")
-        vault_token = get_vault_token()
+        # Steps 1-4: Vault token, database credentials, connection and schema
+        connection, db_creds, schema_version = prepare_database()
         
-        # Step 2: Retrieve dynamic database credentials
-        logger.info("Retrieving database credentials...")
-        db_creds = get_database_credentials(vault_token)
-        
-        # Step 3: Connect to RDS using dynamic credentials
-        logger.info("Connecting to RDS...")
-        connection = pymysql.connect(
-            host=os.environ['RDS_ENDPOINT'],
-            port=3306,
-            user=db_creds['username'],
-            password=db_creds['password'],
-            database=os.environ['DATABASE_NAME'],
-            connect_timeout=10,
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        
-        # Step 4: Ensure table exists
-        create_table_if_not_exists(connection)
+        # Read API: GET returns a page of log entries instead of inserting
+        if event.get('httpMethod') == 'GET':
+            with phase('read'):
+                page = read_logs(connection, event.get('queryStringParameters') or {})
+            return {
+                'statusCode': 200,
+                'body': json.dumps(page, default=str)
+            }
         
         # Step 5: Execute database operation
-        with connection.cursor() as cursor:
-            # Extract request info from API Gateway event or use defaults
-            source_ip = "unknown"
-            user_agent = "unknown"
-            
-            if 'requestContext' in event and 'identity' in event['requestContext']:
-                source_ip = event['requestContext']['identity'].get('sourceIp', 'unknown')
-                user_agent = event['requestContext']['identity'].get('userAgent', 'unknown')
-            
-            cursor.execute("""
-                INSERT INTO logs (message, source_ip, user_agent) 
-                VALUES (%s, %s, %s)
-            """, (
+        # Extract request info from API Gateway event or use defaults
+        source_ip = "unknown"
+        user_agent = "unknown"
+        
+        if 'requestContext' in event and 'identity' in event['requestContext']:
+            source_ip = event['requestContext']['identity'].get('sourceIp', 'unknown')
+            user_agent = event['requestContext']['identity'].get('userAgent', 'unknown')
+        
+        with phase('insert'):
+            log_count = insert_logs(connection, schema_version, [(
                 'Lambda function executed securely with Vault dynamic credentials',
                 source_ip,
                 user_agent
-            ))
-            connection.commit()
+            )])
         
-        # Step 6: Query to verify insertion
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as count FROM logs")
-            result = cursor.fetchone()
-            log_count = result['count']
-        
-        connection.close()
+        # Step 6: Exact count only when explicitly requested (?count=exact)
+        if (event.get('queryStringParameters') or {}).get('count') == 'exact':
+            with phase('count'):
+                log_count = count_logs(connection)
         
         logger.info(f"Database operation completed successfully. Total log entries: {log_count}")
         
@@ -202,6 +1048,13 @@ def lambda_handler(event, context):
             })
         }
         
+    except InvalidRequestError as e:
+        logger.warning(f"Invalid request: {str(e)}")
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'Invalid request', 'details': str(e)})
+        }
+        
     except VaultAuthError as e:
         logger.error(f"Vault authentication error: {str(e)}")
         return {
@@ -211,6 +1064,8 @@ def lambda_handler(event, context):
         
     except pymysql.Error as e:
         logger.error(f"Database connection error: {str(e)}")
+        # Do not hand a connection in an unknown state to the next invocation
+        close_db_connection()
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Database connection failed', 'details': str(e)})
@@ -0,0 +1,163 @@
+"""
+Versioned schema migrations for the Lambda's logs database.
+
+The Lambda applies pending migrations once per container. They can also be
+applied ahead of a deployment with an account that has DDL privileges:
+
+    RDS_ENDPOINT=... DATABASE_NAME=... DB_USER=admin DB_PASSWORD=... python migrations.py
+"""
+
+import os
+import sys
+import logging
+import pymysql
+
+import partitions
+
+logger = logging.getLogger()
+
+# Named lock so concurrent containers do not apply the same migration twice
+MIGRATION_LOCK = 'logs_schema_migration'
+
+# Ordered (version, description, statements); append new entries, never edit applied ones.
+# A statement may be a callable returning the SQL when it depends on the date of migration.
+MIGRATIONS = [
+    (1, "create logs table", [
+        """
+        CREATE TABLE IF NOT EXISTS logs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            message TEXT,
+            source_ip VARCHAR(45),
+            user_agent TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    ]),
+    (2, "maintain logs row count in logs_counter", [
+        """
+        CREATE TABLE IF NOT EXISTS logs_counter (
+            id TINYINT PRIMARY KEY,
+            total BIGINT NOT NULL
+        )
+        """,
+        "INSERT INTO logs_counter (id, total) SELECT 1, COUNT(*) FROM logs",
+    ]),
+    (3, "add keyset pagination indexes to logs", [
+        """
+        ALTER TABLE logs
+            ADD INDEX idx_logs_created_at_id (created_at, id),
+            ADD INDEX idx_logs_source_ip_created_at_id (source_ip, created_at, id),
+            ALGORITHM=INPLACE, LOCK=NONE
+        """
+    ]),
+    (4, "partition logs by month on created_at", [
+        # MySQL requires the partitioning column in every unique key
+        """
+        ALTER TABLE logs
+            MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY (id, created_at)
+        """,
+        partitions.initial_partitioning_sql,
+    ]),
+]
+
+# First version whose schema maintains logs_counter
+COUNTER_VERSION = 2
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection):
+    """
+    Return the highest applied migration version, 0 for an unmigrated database
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) AS found FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = 'schema_migrations'"
+        )
+        if not _first_value(cursor.fetchone()):
+            return 0
+        cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+        return _first_value(cursor.fetchone()) or 0
+
+def apply_migrations(connection):
+    """
+    Apply all pending migrations in order
+    Returns: list of versions that were applied
+    """
+    applied = []
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, 30) AS locked", (MIGRATION_LOCK,))
+        if _first_value(cursor.fetchone()) != 1:
+            raise pymysql.OperationalError("Timed out waiting for the migration lock")
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255),
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+        version = current_version(connection)
+
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+
+            logger.info(f"Applying migration {migration_version}: {description}")
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement() if callable(statement) else statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                    (migration_version, description)
+                )
+            connection.commit()
+            applied.append(migration_version)
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+
+    return applied
+
+def _first_value(row):
+    """Return the first column of a row fetched with either cursor class"""
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return next(iter(row.values()))
+    return row[0]
+
+def main():
+    """
+    Offline entry point: apply pending migrations with the credentials in the environment
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    connection = pymysql.connect(
+        host=os.environ['RDS_ENDPOINT'],
+        port=int(os.environ.get('DB_PORT', '3306')),
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        database=os.environ['DATABASE_NAME'],
+        connect_timeout=10
+    )
+
+    try:
+        applied = apply_migrations(connection)
+    finally:
+        connection.close()
+
+    if applied:
+        logger.info(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        logger.info(f"Schema already at version {LATEST_VERSION}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Monthly RANGE partition maintenance for the logs table.
+
+From migration 4 the logs table is partitioned by month on created_at, one
+partition per month named pYYYYMM plus a pmax catch-all. The maintenance
+routine keeps MONTHS_AHEAD future partitions available and drops partitions
+older than the retention period, which removes expired rows instantly instead
+of running a mass DELETE.
+
+The Lambda runs it on a schedule; it can also be run offline:
+
+    RDS_ENDPOINT=... DATABASE_NAME=... DB_USER=admin DB_PASSWORD=... LOG_RETENTION_MONTHS=12 python partitions.py
+"""
+
+import os
+import sys
+import datetime
+import logging
+import pymysql
+
+logger = logging.getLogger()
+
+# Number of future monthly partitions kept ahead of the current month
+MONTHS_AHEAD = 3
+
+def _add_months(month, months):
+    """First day of the month `months` after the given first-of-month date"""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def _current_month(today=None):
+    today = today or datetime.datetime.utcnow().date()
+    return today.replace(day=1)
+
+def _partition_definition(month):
+    """Partition holding the rows created during the given month"""
+    upper = _add_months(month, 1)
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN (UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))"
+
+def initial_partitioning_sql(today=None):
+    """
+    DDL partitioning an unpartitioned logs table. Existing rows land in the
+    partition named after the previous month, which therefore also holds all
+    older rows and is dropped once that month leaves the retention period.
+    """
+    current = _current_month(today)
+    months = [_add_months(current, offset) for offset in range(-1, MONTHS_AHEAD + 1)]
+    definitions = [_partition_definition(month) for month in months]
+    definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    return (
+        "ALTER TABLE logs PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (\n    "
+        + ",\n    ".join(definitions)
+        + "\n)"
+    )
+
+def list_partition_months(connection):
+    """
+    Return the months of the table's monthly partitions, oldest first;
+    an empty list when the table is not partitioned
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT PARTITION_NAME AS name FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'logs' AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """)
+        rows = cursor.fetchall()
+
+    names = [row['name'] if isinstance(row, dict) else row[0] for row in rows]
+    return [datetime.datetime.strptime(name[1:], '%Y%m').date() for name in names if name != 'pmax']
+
+def maintain_partitions(connection, retention_months, months_ahead=MONTHS_AHEAD, today=None):
+    """
+    Create missing future partitions and drop the ones older than
+    retention_months full months before the current month
+    Returns: dict with the names of created and dropped partitions
+    """
+    months = list_partition_months(connection)
+    if not months:
+        raise pymysql.OperationalError("logs table is not partitioned; apply migration 4 first")
+
+    current = _current_month(today)
+    result = {'created': [], 'dropped': []}
+
+    # Split the (empty) pmax partition to add the months that are missing
+    missing = []
+    month = _add_months(months[-1], 1)
+    while month <= _add_months(current, months_ahead):
+        missing.append(month)
+        month = _add_months(month, 1)
+
+    if missing:
+        definitions = [_partition_definition(m) for m in missing]
+        definitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE logs REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})")
+        result['created'] = [f"p{m:%Y%m}" for m in missing]
+
+    # Never drop the current month, whatever the retention setting
+    cutoff = _add_months(current, -max(retention_months, 0))
+    expired = [f"p{m:%Y%m}" for m in months if m < cutoff]
+
+    for name in expired:
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) AS count FROM logs PARTITION ({name})")
+            row = cursor.fetchone()
+            removed = row['count'] if isinstance(row, dict) else row[0]
+            cursor.execute(f"ALTER TABLE logs DROP PARTITION {name}")
+            # Keep the maintained total in line with the rows that were dropped
+            cursor.execute("UPDATE logs_counter SET total = GREATEST(total - %s, 0) WHERE id = 1", (removed,))
+        connection.commit()
+        logger.info(f"Dropped partition {name} ({removed} rows)")
+        result['dropped'].append(name)
+
+    return result
+
+def main():
+    """
+    Offline entry point: maintain partitions with the credentials in the environment
+    """
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    connection = pymysql.connect(
+        host=os.environ['RDS_ENDPOINT'],
+        port=int(os.environ.get('DB_PORT', '3306')),
+        user=os.environ['DB_USER'],
+        password=os.environ['DB_PASSWORD'],
+        database=os.environ['DATABASE_NAME'],
+        connect_timeout=10,
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+    try:
+        result = maintain_partitions(connection, int(os.environ.get('LOG_RETENTION_MONTHS', '12')))
+    finally:
+        connection.close()
+
+    logger.info(f"Created partitions: {result['created']}; dropped partitions: {result['dropped']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
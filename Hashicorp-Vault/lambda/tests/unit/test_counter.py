@@ -0,0 +1,112 @@
+import os
+
+import pymysql
+import pytest
+
+os.environ.setdefault("VAULT_BACKGROUND_REFRESH", "false")
+
+import lambda_function  # noqa: E402
+import migrations  # noqa: E402
+
+
+class FakeCursor:
+    """ Keeps a logs row count and a maintained counter like MySQL would"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+        self.lastrowid = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, query, rows):
+        self.connection.executed.append("INSERT")
+        self.connection.rows += len(rows)
+
+    def execute(self, query, args=None):
+        statement = " ".join(query.split())
+        self.connection.executed.append(statement)
+        if statement.startswith("UPDATE logs_counter"):
+            self.connection.total += args[0]
+            # LAST_INSERT_ID(expr) is reported as the cursor's lastrowid
+            self.lastrowid = self.connection.total
+        elif statement.startswith("SELECT COUNT(*) as count FROM logs"):
+            self.row = {"count": self.connection.rows}
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    """ Connection to a logs table holding the given number of rows"""
+
+    def __init__(self, rows=0, total=None):
+        self.rows = rows
+        self.total = rows if total is None else total
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+ROWS = [("message", "127.0.0.1", "agent"), ("message", "127.0.0.2", "agent")]
+
+
+def test_insert_logs_uses_counter():
+    connection = FakeConnection(rows=40, total=40)
+
+    total = lambda_function.insert_logs(connection, migrations.COUNTER_VERSION, ROWS)
+
+    assert total == 42
+    assert connection.commits == 1
+    assert not any(statement.startswith("SELECT COUNT(*)") for statement in connection.executed)
+
+
+def test_insert_logs_counts_before_counter_migration():
+    connection = FakeConnection(rows=40)
+
+    total = lambda_function.insert_logs(connection, migrations.COUNTER_VERSION - 1, ROWS)
+
+    assert total == 42
+    assert not any(statement.startswith("UPDATE logs_counter") for statement in connection.executed)
+
+
+@pytest.fixture()
+def failing_migrations(monkeypatch):
+    """ apply_migrations fails, as without DDL privileges or on a lock timeout"""
+
+    def apply_migrations(connection):
+        raise pymysql.OperationalError("Timed out waiting for the migration lock")
+
+    monkeypatch.setattr(migrations, "apply_migrations", apply_migrations)
+    monkeypatch.setattr(lambda_function, "_schema_version", None)
+
+
+def test_failed_migration_keeps_existing_counter(failing_migrations, monkeypatch):
+    monkeypatch.setattr(migrations, "current_version", lambda connection: migrations.COUNTER_VERSION)
+
+    assert lambda_function.ensure_schema(FakeConnection()) == migrations.COUNTER_VERSION
+    assert lambda_function._schema_version == migrations.COUNTER_VERSION
+
+
+def test_failed_migration_without_counter_is_checked_again(failing_migrations, monkeypatch):
+    versions = iter([1, 1, migrations.COUNTER_VERSION, migrations.COUNTER_VERSION])
+    monkeypatch.setattr(migrations, "current_version", lambda connection: next(versions))
+
+    assert lambda_function.ensure_schema(FakeConnection()) == 1
+    assert lambda_function._schema_version is None
+
+    # Once another container has created logs_counter, the next invocation uses it
+    assert lambda_function.ensure_schema(FakeConnection()) == migrations.COUNTER_VERSION
+    assert lambda_function._schema_version == migrations.COUNTER_VERSION
@@ -0,0 +1,189 @@
+import os
+import time
+
+import pytest
+import requests
+
+# No background refresher thread in tests
+os.environ.setdefault("VAULT_BACKGROUND_REFRESH", "false")
+os.environ.setdefault("VAULT_ADDR", "http://vault.test:8200")
+
+import lambda_function  # noqa: E402
+
+
+class FakeResponse:
+    """ Minimal requests.Response stand-in"""
+
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.body = body or {}
+        self.text = str(self.body)
+
+    def json(self):
+        return self.body
+
+
+class FakeVault:
+    """ Stands in for vault_request, issuing a new user per credentials read"""
+
+    def __init__(self):
+        self.calls = []
+        self.issued = 0
+        self.renewal = FakeResponse(200, {"lease_duration": 3600})
+
+    def __call__(self, method, path, token=None, timeout=None, **kwargs):
+        self.calls.append((method, path))
+        if path.startswith("/v1/database/creds/"):
+            self.issued += 1
+            return FakeResponse(200, {
+                "data": {"username": f"v-lambda-{self.issued}", "password": "secret"},
+                "lease_id": f"database/creds/lambda-role/lease-{self.issued}",
+                "lease_duration": 3600,
+                "renewable": True,
+            })
+        if path.startswith("/v1/database/static-creds/"):
+            self.issued += 1
+            return FakeResponse(200, {
+                "data": {"username": "lambda-static", "password": f"rotated-{self.issued}", "ttl": 600},
+                "lease_id": "",
+                "lease_duration": 0,
+                "renewable": False,
+            })
+        if path == "/v1/sys/leases/renew":
+            if isinstance(self.renewal, Exception):
+                raise self.renewal
+            return self.renewal
+        if path.startswith("/v1/sys/leases/revoke/"):
+            return FakeResponse(204)
+        raise AssertionError(f"unexpected Vault call {method} {path}")
+
+    def paths(self, prefix):
+        return [path for _, path in self.calls if path.startswith(prefix)]
+
+
+@pytest.fixture()
+def vault(monkeypatch):
+    """ Empty credential caches and a FakeVault behind vault_request"""
+
+    fake = FakeVault()
+    monkeypatch.setattr(lambda_function, "vault_request", fake)
+    monkeypatch.setattr(lambda_function, "close_db_connection", lambda: None)
+    lambda_function._clear_db_credentials()
+    lambda_function._clear_vault_token()
+    yield fake
+    lambda_function._clear_db_credentials()
+    lambda_function._clear_vault_token()
+
+
+def expire_in(seconds):
+    """ Move the cached credentials to expire the given seconds from now"""
+    lambda_function._db_credentials["expires_at"] = time.time() + seconds
+
+
+def test_credentials_issued_once_across_warm_calls(vault):
+    users = {lambda_function.get_database_credentials("token")["username"] for _ in range(20)}
+
+    assert users == {"v-lambda-1"}
+    assert vault.issued == 1
+    assert vault.paths("/v1/sys/leases/renew") == []
+
+
+def test_lease_renewed_near_expiry(vault):
+    lambda_function.get_database_credentials("token")
+    expire_in(60)
+
+    creds = lambda_function.get_database_credentials("token")
+
+    assert creds["username"] == "v-lambda-1"
+    assert vault.paths("/v1/sys/leases/renew") == ["/v1/sys/leases/renew"]
+    assert vault.issued == 1
+    assert lambda_function._db_credentials["expires_at"] > time.time() + 3000
+
+
+def test_reissued_after_failed_renewal(vault):
+    lambda_function.get_database_credentials("token")
+    expire_in(60)
+    vault.renewal = FakeResponse(403, {"errors": ["permission denied"]})
+
+    creds = lambda_function.get_database_credentials("token")
+
+    assert creds["username"] == "v-lambda-2"
+    assert vault.issued == 2
+    assert lambda_function._db_credentials["lease_id"] == "database/creds/lambda-role/lease-2"
+
+
+def test_reissued_after_renewal_network_error(vault):
+    lambda_function.get_database_credentials("token")
+    expire_in(60)
+    vault.renewal = requests.exceptions.ConnectionError("connection reset")
+
+    assert lambda_function.get_database_credentials("token")["username"] == "v-lambda-2"
+
+
+def test_reissued_when_renewal_is_capped_by_max_ttl(vault):
+    lambda_function.get_database_credentials("token")
+    expire_in(60)
+    vault.renewal = FakeResponse(200, {"lease_duration": 120})
+
+    assert lambda_function.get_database_credentials("token")["username"] == "v-lambda-2"
+    assert len(vault.paths("/v1/sys/leases/renew")) == 1
+
+
+def test_expired_lease_reissued_without_renewal(vault):
+    lambda_function.get_database_credentials("token")
+    expire_in(-1)
+
+    assert lambda_function.get_database_credentials("token")["username"] == "v-lambda-2"
+    assert vault.paths("/v1/sys/leases/renew") == []
+
+
+def test_static_credentials_reread_after_rotation(vault, monkeypatch):
+    monkeypatch.setattr(lambda_function, "DB_CREDENTIALS_MODE", "static")
+
+    first = lambda_function.get_database_credentials("token")
+    # No lease to renew: the cache is kept until just after the next rotation
+    expire_in(60)
+    assert lambda_function.get_database_credentials("token") is first
+    expire_in(-1)
+    second = lambda_function.get_database_credentials("token")
+
+    assert (first["password"], second["password"]) == ("rotated-1", "rotated-2")
+    assert vault.paths("/v1/sys/leases/renew") == []
+
+
+def test_revoke_db_credentials(vault):
+    lambda_function.get_database_credentials("token")
+    lambda_function._vault_token["client_token"] = "token"
+
+    lambda_function.revoke_db_credentials()
+
+    assert vault.paths("/v1/sys/leases/revoke/") == [
+        "/v1/sys/leases/revoke/database/creds/lambda-role/lease-1"
+    ]
+    assert lambda_function._db_credentials["data"] is None
+    assert lambda_function.get_database_credentials("token")["username"] == "v-lambda-2"
+
+
+def test_revoke_without_token_only_clears_cache(vault):
+    lambda_function.get_database_credentials("token")
+
+    lambda_function.revoke_db_credentials()
+
+    assert vault.paths("/v1/sys/leases/revoke/") == []
+    assert lambda_function._db_credentials["data"] is None
+
+
+def test_vault_token_cached_across_warm_calls(vault, monkeypatch):
+    logins = []
+
+    def login():
+        logins.append(1)
+        return {"client_token": f"token-{len(logins)}", "lease_duration": 3600, "renewable": True}
+
+    monkeypatch.setattr(lambda_function, "login_to_vault", login)
+    monkeypatch.setattr(lambda_function, "VAULT_PROXY_ADDR", None)
+
+    tokens = {lambda_function.get_vault_token() for _ in range(10)}
+
+    assert tokens == {"token-1"}
+    assert len(logins) == 1
@@ -0,0 +1,137 @@
+import os
+
+import pymysql
+import pytest
+
+os.environ.setdefault("VAULT_BACKGROUND_REFRESH", "false")
+
+import lambda_function  # noqa: E402
+import migrations  # noqa: E402
+
+
+class FakeCursor:
+    """ Answers the migration bookkeeping queries from the connection's state"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, args=None):
+        connection = self.connection
+        statement = " ".join(query.split())
+        connection.executed.append(statement)
+        if statement in connection.failing:
+            raise pymysql.OperationalError(f"cannot run {statement}")
+        if "information_schema.tables" in statement:
+            self.row = {"found": int(connection.has_table)}
+        elif statement.startswith("SELECT MAX(version)"):
+            self.row = {"version": max(connection.applied, default=None)}
+        elif statement.startswith("SELECT GET_LOCK"):
+            self.row = {"locked": connection.lock}
+        elif statement.startswith("CREATE TABLE IF NOT EXISTS schema_migrations"):
+            connection.has_table = True
+        elif statement.startswith("INSERT INTO schema_migrations"):
+            connection.applied.append(args[0])
+
+    def fetchone(self):
+        return self.row
+
+
+class FakeConnection:
+    """ Database at the given applied migration versions"""
+
+    def __init__(self, applied=(), lock=1):
+        self.applied = list(applied)
+        self.has_table = bool(applied)
+        self.lock = lock
+        self.failing = set()
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.fixture()
+def fresh_container(monkeypatch):
+    """ A container that has not checked the schema yet"""
+
+    monkeypatch.setattr(lambda_function, "_schema_version", None)
+
+
+def test_current_version_without_migrations_table():
+    assert migrations.current_version(FakeConnection()) == 0
+
+
+def test_current_version():
+    assert migrations.current_version(FakeConnection(applied=[1, 2, 3])) == 3
+
+
+def test_apply_migrations_from_scratch():
+    connection = FakeConnection()
+
+    applied = migrations.apply_migrations(connection)
+
+    assert applied == [version for version, _, _ in migrations.MIGRATIONS]
+    assert connection.applied == applied
+    assert connection.commits == len(applied)
+    assert connection.executed[-1].startswith("SELECT RELEASE_LOCK")
+
+
+def test_apply_migrations_skips_applied_versions():
+    connection = FakeConnection(applied=[1, 2])
+
+    assert migrations.apply_migrations(connection) == [3, 4]
+    assert not any("CREATE TABLE IF NOT EXISTS logs " in statement for statement in connection.executed)
+
+
+def test_apply_migrations_lock_timeout():
+    connection = FakeConnection(lock=0)
+
+    with pytest.raises(pymysql.OperationalError):
+        migrations.apply_migrations(connection)
+
+    assert connection.applied == []
+    assert len(connection.executed) == 1
+
+
+def test_apply_migrations_releases_lock_on_failure():
+    connection = FakeConnection(applied=[1, 2])
+    connection.failing.add(" ".join(migrations.MIGRATIONS[2][2][0].split()))
+
+    with pytest.raises(pymysql.OperationalError):
+        migrations.apply_migrations(connection)
+
+    assert connection.applied == [1, 2]
+    assert connection.executed[-1].startswith("SELECT RELEASE_LOCK")
+
+
+def test_ensure_schema_runs_once_per_container(fresh_container):
+    connection = FakeConnection(applied=[1, 2, 3])
+
+    assert lambda_function.ensure_schema(connection) == migrations.LATEST_VERSION
+    checked = len(connection.executed)
+    assert lambda_function.ensure_schema(connection) == migrations.LATEST_VERSION
+
+    # Later invocations run no queries at all
+    assert len(connection.executed) == checked
+
+
+def test_ensure_schema_skips_ddl_when_up_to_date(fresh_container):
+    connection = FakeConnection(applied=[version for version, _, _ in migrations.MIGRATIONS])
+
+    assert lambda_function.ensure_schema(connection) == migrations.LATEST_VERSION
+    assert not any(statement.startswith("SELECT GET_LOCK") for statement in connection.executed)
@@ -0,0 +1,164 @@
+import datetime
+import re
+
+import pymysql
+import pytest
+
+import partitions
+
+
+class FakeCursor:
+    """ Records statements and answers the partition queries"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.row = None
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, args=None):
+        self.connection.executed.append((" ".join(query.split()), args))
+        if "information_schema.PARTITIONS" in query:
+            self.rows = [{"name": name} for name in self.connection.partitions]
+        match = re.search(r"FROM logs PARTITION \((\w+)\)", query)
+        if match:
+            self.row = {"count": self.connection.counts.get(match.group(1), 0)}
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.row
+
+
+class TupleCursor(FakeCursor):
+    """ Cursor returning rows as tuples, like pymysql's default cursor class"""
+
+    def fetchall(self):
+        return [(row["name"],) for row in self.rows]
+
+
+class FakeConnection:
+    """ Connection whose logs table has the given partitions and row counts"""
+
+    def __init__(self, partitions, counts=None):
+        self.partitions = partitions
+        self.counts = counts or {}
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def statements(self, prefix):
+        return [(query, args) for query, args in self.executed if query.startswith(prefix)]
+
+
+def monthly(first, last):
+    """ Partition names pYYYYMM from first to last (inclusive) plus pmax"""
+    names = []
+    month = first
+    while month <= last:
+        names.append(f"p{month:%Y%m}")
+        month = partitions._add_months(month, 1)
+    return names + ["pmax"]
+
+
+def test_add_months_crosses_years():
+    assert partitions._add_months(datetime.date(2025, 11, 1), 3) == datetime.date(2026, 2, 1)
+    assert partitions._add_months(datetime.date(2026, 1, 1), -1) == datetime.date(2025, 12, 1)
+    assert partitions._add_months(datetime.date(2026, 1, 1), -13) == datetime.date(2024, 12, 1)
+
+
+def test_initial_partitioning_sql():
+    sql = partitions.initial_partitioning_sql(today=datetime.date(2026, 1, 15))
+
+    assert sql.startswith("ALTER TABLE logs PARTITION BY RANGE (UNIX_TIMESTAMP(created_at))")
+    assert re.findall(r"PARTITION (\w+)", sql)[1:] == [
+        "p202512", "p202601", "p202602", "p202603", "p202604", "pmax"
+    ]
+    # The previous month also holds all older rows
+    assert "PARTITION p202512 VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00'))" in sql
+    assert "PARTITION p202604 VALUES LESS THAN (UNIX_TIMESTAMP('2026-05-01 00:00:00'))" in sql
+    assert sql.rstrip().endswith("PARTITION pmax VALUES LESS THAN MAXVALUE\n)")
+
+
+def test_list_partition_months_accepts_tuple_rows():
+    connection = FakeConnection(["p202512", "p202601", "pmax"])
+    connection.cursor = lambda: TupleCursor(connection)
+
+    assert partitions.list_partition_months(connection) == [
+        datetime.date(2025, 12, 1), datetime.date(2026, 1, 1)
+    ]
+
+
+def test_maintain_requires_partitioned_table():
+    with pytest.raises(pymysql.OperationalError):
+        partitions.maintain_partitions(FakeConnection([]), 12, today=datetime.date(2026, 3, 10))
+
+
+def test_maintain_creates_missing_months():
+    connection = FakeConnection(monthly(datetime.date(2026, 1, 1), datetime.date(2026, 4, 1)))
+
+    result = partitions.maintain_partitions(connection, 12, today=datetime.date(2026, 3, 10))
+
+    assert result == {"created": ["p202605", "p202606"], "dropped": []}
+    (query, _), = connection.statements("ALTER TABLE logs REORGANIZE PARTITION pmax")
+    assert re.findall(r"PARTITION (p\d+|pmax) VALUES", query) == ["p202605", "p202606", "pmax"]
+    assert "PARTITION p202606 VALUES LESS THAN (UNIX_TIMESTAMP('2026-07-01 00:00:00'))" in query
+
+
+def test_maintain_creates_nothing_when_ahead():
+    connection = FakeConnection(monthly(datetime.date(2026, 1, 1), datetime.date(2026, 8, 1)))
+
+    result = partitions.maintain_partitions(connection, 12, today=datetime.date(2026, 3, 10))
+
+    assert result == {"created": [], "dropped": []}
+    assert connection.statements("ALTER TABLE") == []
+
+
+def test_maintain_drops_partitions_past_retention():
+    connection = FakeConnection(
+        monthly(datetime.date(2025, 1, 1), datetime.date(2026, 6, 1)),
+        counts={"p202501": 7, "p202502": 3}
+    )
+
+    result = partitions.maintain_partitions(connection, 12, today=datetime.date(2026, 3, 10))
+
+    # The cutoff is 12 full months before March 2026
+    assert result["dropped"] == ["p202501", "p202502"]
+    assert [query for query, _ in connection.statements("ALTER TABLE logs DROP PARTITION")] == [
+        "ALTER TABLE logs DROP PARTITION p202501",
+        "ALTER TABLE logs DROP PARTITION p202502",
+    ]
+    assert connection.commits == 2
+
+
+def test_maintain_decrements_counter_by_dropped_rows():
+    connection = FakeConnection(
+        monthly(datetime.date(2025, 1, 1), datetime.date(2026, 6, 1)),
+        counts={"p202501": 7, "p202502": 3}
+    )
+
+    partitions.maintain_partitions(connection, 12, today=datetime.date(2026, 3, 10))
+
+    updates = connection.statements("UPDATE logs_counter")
+    assert [args for _, args in updates] == [(7,), (3,)]
+    assert all("GREATEST(total - %s, 0)" in query for query, _ in updates)
+
+
+@pytest.mark.parametrize("retention_months", [0, -5])
+def test_maintain_never_drops_current_month(retention_months):
+    connection = FakeConnection(monthly(datetime.date(2026, 1, 1), datetime.date(2026, 6, 1)))
+
+    result = partitions.maintain_partitions(connection, retention_months, today=datetime.date(2026, 3, 10))
+
+    assert result["dropped"] == ["p202601", "p202602"]
@@ -0,0 +1,136 @@
+import datetime
+import os
+
+import pytest
+
+os.environ.setdefault("VAULT_BACKGROUND_REFRESH", "false")
+
+import lambda_function  # noqa: E402
+
+
+class FakeCursor:
+    """ Records the page query and returns the connection's rows"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, args=None):
+        self.connection.queries.append((" ".join(query.split()), args))
+
+    def fetchall(self):
+        limit = self.connection.queries[-1][1][-1]
+        return self.connection.rows[:limit]
+
+    def fetchone(self):
+        return {"count": len(self.connection.rows)}
+
+
+class FakeConnection:
+    """ Connection over a fixed, already ordered list of log rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def make_rows(count):
+    start = datetime.datetime(2026, 3, 1, 12, 0, 0)
+    return [
+        {
+            "id": index + 1,
+            "message": f"entry {index}",
+            "source_ip": "127.0.0.1",
+            "user_agent": "agent",
+            "created_at": start + datetime.timedelta(seconds=index),
+        }
+        for index in range(count)
+    ]
+
+
+def test_cursor_round_trip():
+    row = make_rows(1)[0]
+
+    assert lambda_function.decode_cursor(lambda_function.encode_cursor(row)) == ("2026-03-01 12:00:00", 1)
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "WzFd", ""])
+def test_invalid_cursor(cursor):
+    with pytest.raises(lambda_function.InvalidRequestError):
+        lambda_function.decode_cursor(cursor)
+
+
+def test_first_page_has_next_cursor():
+    connection = FakeConnection(make_rows(5))
+
+    page = lambda_function.read_logs(connection, {"limit": "3"})
+
+    assert [row["id"] for row in page["items"]] == [1, 2, 3]
+    assert lambda_function.decode_cursor(page["next_cursor"]) == ("2026-03-01 12:00:02", 3)
+    # One extra row is fetched to detect the next page
+    assert connection.queries[0][1] == [4]
+
+
+def test_last_page_has_no_cursor():
+    page = lambda_function.read_logs(FakeConnection(make_rows(2)), {"limit": "3"})
+
+    assert len(page["items"]) == 2
+    assert page["next_cursor"] is None
+
+
+def test_filters_and_cursor_become_keyset_conditions():
+    connection = FakeConnection([])
+    cursor = lambda_function.encode_cursor(make_rows(3)[2])
+
+    lambda_function.read_logs(connection, {
+        "source_ip": "10.0.0.1",
+        "from": "2026-03-01T00:00:00Z",
+        "to": "2026-04-01T00:00:00",
+        "cursor": cursor,
+    })
+
+    query, args = connection.queries[0]
+    assert ("WHERE source_ip = %s AND created_at >= %s AND created_at < %s "
+            "AND (created_at > %s OR (created_at = %s AND id > %s))") in query
+    assert args == [
+        "10.0.0.1", "2026-03-01 00:00:00", "2026-04-01 00:00:00",
+        "2026-03-01 12:00:02", "2026-03-01 12:00:02", 3,
+        lambda_function.DEFAULT_PAGE_SIZE + 1,
+    ]
+    assert "ON page.id = l.id AND page.created_at = l.created_at" in query
+
+
+def test_limit_is_capped():
+    connection = FakeConnection([])
+
+    lambda_function.read_logs(connection, {"limit": str(lambda_function.MAX_PAGE_SIZE * 10)})
+
+    assert connection.queries[0][1] == [lambda_function.MAX_PAGE_SIZE + 1]
+
+
+@pytest.mark.parametrize("params", [{"limit": "ten"}, {"limit": "0"}, {"from": "yesterday"}])
+def test_invalid_parameters(params):
+    with pytest.raises(lambda_function.InvalidRequestError):
+        lambda_function.read_logs(FakeConnection([]), params)
+
+
+def test_reads_end_their_transaction():
+    connection = FakeConnection(make_rows(2))
+
+    lambda_function.read_logs(connection, {})
+    lambda_function.count_logs(connection)
+
+    # A snapshot left open on the reused connection would pin later reads to it
+    assert connection.rollbacks == 2
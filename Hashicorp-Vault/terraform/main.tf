@@ -207,6 +207,29 @@ resource "null_resource" "build_lambda" {
   }
 }
 
+# Optional Vault caching proxy, shipped as a Lambda extension layer
+resource "null_resource" "build_vault_proxy" {
+  count = var.use_vault_proxy ? 1 : 0
+
+  triggers = {
+    always_run = timestamp()
+  }
+
+  provisioner "local-exec" {
+    command = "cd ${path.module}/../extension && chmod +x build.sh && ./build.sh"
+  }
+}
+
+resource "aws_lambda_layer_version" "vault_proxy" {
+  count = var.use_vault_proxy ? 1 : 0
+
+  filename            = "${path.module}/../extension/vault_proxy_layer.zip"
+  layer_name          = "vault-proxy"
+  compatible_runtimes = ["python3.9"]
+
+  depends_on = [null_resource.build_vault_proxy]
+}
+
 # Updated Lambda Function Resource
 resource "aws_lambda_function" "database_writer" {
   # Use the zip produced by the build script (located at ../lambda/lambda_function.zip)
@@ -218,12 +241,16 @@ resource "aws_lambda_function" "database_writer" {
   timeout         = 30
   memory_size     = 128
   
+  layers = var.use_vault_proxy ? [aws_lambda_layer_version.vault_proxy[0].arn] : []
+
   environment {
-    variables = {
-      VAULT_ADDR      = "http://${aws_instance.vault.public_ip}:8200"
-      RDS_ENDPOINT    = aws_db_instance.main.address
-      DATABASE_NAME   = var.database_name
-    }
+    variables = merge({
+      VAULT_ADDR           = "http://${aws_instance.vault.public_ip}:8200"
+      RDS_ENDPOINT         = aws_db_instance.main.address
+      DATABASE_NAME        = var.database_name
+      DB_CREDENTIALS_MODE  = var.static_db_username == "" ? "dynamic" : "static"
+      DB_STATIC_ROLE       = "lambda-static-role"
+    }, var.use_vault_proxy ? { VAULT_PROXY_ADDR = "http://127.0.0.1:8100" } : {})
   }
 
   vpc_config {
@@ -247,12 +274,87 @@ resource "aws_lambda_permission" "apigw" {
   principal     = "apigateway.amazonaws.com"
 }
 
+# SQS queue for buffered audit-log ingestion; the Lambda writes each batch
+# with a single multi-row INSERT and reports per-record failures
+resource "aws_sqs_queue" "audit_logs" {
+  name                       = "vault-audit-logs"
+  visibility_timeout_seconds = 180 # 6x the Lambda timeout
+}
+
+resource "aws_lambda_event_source_mapping" "audit_logs" {
+  event_source_arn                   = aws_sqs_queue.audit_logs.arn
+  function_name                      = aws_lambda_function.database_writer.arn
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
+}
+
+# Partition maintenance runs as its own function and IAM role, which log in to
+# a Vault role that can read the DDL-capable maintenance-role credentials; the
+# request-serving function cannot
+resource "aws_lambda_function" "partition_maintenance" {
+  filename         = "${path.module}/../lambda/lambda_function.zip"
+  function_name    = "vault-logs-partition-maintenance"
+  role            = aws_iam_role.lambda_maintenance_exec.arn
+  handler         = "lambda_function.maintenance_handler"
+  runtime         = "python3.9"
+  timeout         = 300 # partition DDL on a large table
+  memory_size     = 128
+
+  environment {
+    variables = {
+      VAULT_ADDR               = "http://${aws_instance.vault.public_ip}:8200"
+      RDS_ENDPOINT             = aws_db_instance.main.address
+      DATABASE_NAME            = var.database_name
+      LOG_RETENTION_MONTHS     = var.log_retention_months
+      VAULT_AUTH_ROLE          = "partition-maintenance"
+      VAULT_BACKGROUND_REFRESH = "false"
+    }
+  }
+
+  vpc_config {
+    subnet_ids         = data.aws_subnets.private.ids
+    security_group_ids = [aws_security_group.lambda.id]
+  }
+
+  depends_on = [
+    aws_iam_role_policy.lambda_maintenance,
+    aws_instance.vault,
+    aws_db_instance.main,
+    null_resource.build_lambda
+  ]
+}
+
+# Daily partition maintenance for the logs table (future partitions, retention)
+resource "aws_cloudwatch_event_rule" "partition_maintenance" {
+  name                = "vault-logs-partition-maintenance"
+  schedule_expression = "cron(15 3 * * ? *)"
+}
+
+resource "aws_cloudwatch_event_target" "partition_maintenance" {
+  rule = aws_cloudwatch_event_rule.partition_maintenance.name
+  arn  = aws_lambda_function.partition_maintenance.arn
+}
+
+resource "aws_lambda_permission" "partition_maintenance" {
+  statement_id  = "AllowExecutionFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.partition_maintenance.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.partition_maintenance.arn
+}
+
 # CloudWatch Log Group for Lambda
 resource "aws_cloudwatch_log_group" "lambda" {
   name              = "/aws/lambda/${aws_lambda_function.database_writer.function_name}"
   retention_in_days = 7
 }
 
+resource "aws_cloudwatch_log_group" "partition_maintenance" {
+  name              = "/aws/lambda/${aws_lambda_function.partition_maintenance.function_name}"
+  retention_in_days = 7
+}
+
 # IAM Roles and Policies
 resource "aws_iam_role" "lambda_exec" {
   name = "lambda-vault-execution-role"
@@ -275,6 +377,61 @@ resource "aws_iam_role_policy" "lambda_vault_auth" {
   name = "LambdaVaultAuthPolicy"
   role = aws_iam_role.lambda_exec.id
 
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ]
+        Resource = "arn:aws:logs:*:*:*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "ec2:CreateNetworkInterface",
+          "ec2:DescribeNetworkInterfaces",
+          "ec2:DeleteNetworkInterface"
+        ]
+        Resource = "*"
+      },
+      {
+        Effect = "Allow"
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Resource = aws_sqs_queue.audit_logs.arn
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role" "lambda_maintenance_exec" {
+  name = "lambda-vault-maintenance-role"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = "sts:AssumeRole"
+        Effect = "Allow"
+        Principal = {
+          Service = "lambda.amazonaws.com"
+        }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "lambda_maintenance" {
+  name = "LambdaVaultMaintenancePolicy"
+  role = aws_iam_role.lambda_maintenance_exec.id
+
   policy = jsonencode({
     Version = "2012-10-17"
     Statement = [
@@ -23,6 +23,11 @@ output "lambda_function_name" {
   value       = aws_lambda_function.database_writer.function_name
 }
 
+output "audit_logs_queue_url" {
+  description = "SQS queue for batched log ingestion"
+  value       = aws_sqs_queue.audit_logs.url
+}
+
 output "vault_address" {
   description = "Vault server address"
   value       = "http://${aws_instance.vault.public_ip}:8200"
@@ -62,4 +62,22 @@ variable "my_ip_cidr" {
   description = "Your workstation IP in CIDR form to temporarily allow access to Vault (e.g. 1.2.3.4/32)."
   type        = string
   default     = ""
-}
\ No newline at end of file
+}
+
+variable "use_vault_proxy" {
+  description = "When true, attach the Vault caching proxy extension layer and route the Lambda's Vault calls through it."
+  type        = bool
+  default     = false
+}
+
+variable "static_db_username" {
+  description = "Existing MySQL user to manage as a Vault static role (lambda-static-role). Leave empty to only use dynamic credentials."
+  type        = string
+  default     = ""
+}
+
+variable "log_retention_months" {
+  description = "Months of logs kept by the scheduled partition maintenance; set per environment."
+  type        = number
+  default     = 12
+}
@@ -7,7 +7,7 @@ resource "vault_mount" "database" {
 resource "vault_database_secret_backend_connection" "mysql" {
   backend       = vault_mount.database.path
   name          = "mysql"
-  allowed_roles = ["lambda-role"]
+  allowed_roles = ["lambda-role", "lambda-static-role", "maintenance-role"]
 
   mysql {
     connection_url = "{{username}}:{{password}}@tcp(${aws_db_instance.main.address}:3306)/"
@@ -34,6 +34,34 @@ resource "vault_database_secret_backend_role" "lambda" {
   max_ttl     = 86400 # 24 hours
 }
 
+# Short-lived DDL-capable credentials for the scheduled partition maintenance
+resource "vault_database_secret_backend_role" "maintenance" {
+  backend             = vault_mount.database.path
+  name                = "maintenance-role"
+  db_name             = vault_database_secret_backend_connection.mysql.name
+  creation_statements = [
+    "CREATE USER '{{name}}'@'%' IDENTIFIED BY '{{password}}';",
+    "GRANT SELECT, INSERT, UPDATE, CREATE, ALTER, DROP ON ${var.database_name}.* TO '{{name}}'@'%';"
+  ]
+  revocation_statements = [
+    "DROP USER '{{name}}'@'%';"
+  ]
+  default_ttl = 900  # 15 minutes
+  max_ttl     = 3600 # 1 hour
+}
+
+# Vault-rotated static account, used when the Lambda runs with DB_CREDENTIALS_MODE=static.
+# The MySQL user must already exist with the grants the Lambda needs.
+resource "vault_database_secret_backend_static_role" "lambda" {
+  count = var.static_db_username == "" ? 0 : 1
+
+  backend         = vault_mount.database.path
+  name            = "lambda-static-role"
+  db_name         = vault_database_secret_backend_connection.mysql.name
+  username        = var.static_db_username
+  rotation_period = 86400 # 24 hours
+}
+
 resource "vault_auth_backend" "aws" {
   type = "aws"
 }
@@ -45,6 +73,29 @@ resource "vault_policy" "lambda" {
 path "database/creds/lambda-role" {
   capabilities = ["read"]
 }
+
+path "database/static-creds/lambda-static-role" {
+  capabilities = ["read"]
+}
+
+path "sys/leases/revoke/database/creds/lambda-role/*" {
+  capabilities = ["update"]
+}
+EOT
+}
+
+# Only the partition maintenance function may read the DDL-capable credentials
+resource "vault_policy" "maintenance" {
+  name = "maintenance-policy"
+
+  policy = <<EOT
+path "database/creds/maintenance-role" {
+  capabilities = ["read"]
+}
+
+path "sys/leases/revoke/database/creds/maintenance-role/*" {
+  capabilities = ["update"]
+}
 EOT
 }
 
@@ -56,4 +107,14 @@ resource "vault_aws_auth_backend_role" "lambda" {
   token_policies            = [vault_policy.lambda.name]
   token_ttl                 = 3600
   token_max_ttl             = 86400
-}
\ No newline at end of file
+}
+
+resource "vault_aws_auth_backend_role" "maintenance" {
+  backend                   = vault_auth_backend.aws.path
+  role                      = "partition-maintenance"
+  auth_type                 = "iam"
+  bound_iam_principal_arns  = [aws_iam_role.lambda_maintenance_exec.arn]
+  token_policies            = [vault_policy.maintenance.name]
+  token_ttl                 = 900
+  token_max_ttl             = 900
+}
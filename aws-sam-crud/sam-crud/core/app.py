@@ -1,12 +1,16 @@
 import json
 from aws_lambda_powertools import Logger, Tracer
 import boto3
+from botocore.exceptions import ClientError
 import requests
 
 # sam-crud/core/app.py
 logger = Logger()
 tracer = Tracer()
 
+# DynamoDB rejects TransactWriteItems requests with more than 100 actions
+MAX_TRANSACT_ITEMS = 100
+
 
 def lambda_handler(event, context):
     """Sample pure Lambda function
@@ -42,6 +46,8 @@ def lambda_handler(event, context):
                     return update(data)
                 case '/delete':
                     return delete(data)
+                case '/transact':
+                    return transact(data)
                 case _:
                     return make_response(404, {'message': 'Path Not Found'})
 
@@ -120,6 +126,121 @@ def delete(data):
         logger.error(f"Error deleting item: {e}")
         return make_response(500, {'message': 'Internal Server Error', 'error': str(e)})
 
+def transact(data):
+    """
+    Apply several put/update/delete/condition-check operations atomically.
+
+    Expects a body of the form
+    {"operations": [{"type": "put", "item": {...}},
+                    {"type": "update", "id": ..., "attribute": ..., "value": ...},
+                    {"type": "delete", "id": ...},
+                    {"type": "condition_check", "id": ..., "attribute": ..., "value": ...}],
+     "client_request_token": "optional idempotency token"}
+
+    put/update/delete operations accept an optional "condition" of the form
+    {"attribute": ..., "value": ...}; omitting "value" only checks that the
+    attribute exists.
+    """
+    operations = data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return make_response(400, {'message': 'operations must be a non-empty list'})
+    if len(operations) > MAX_TRANSACT_ITEMS:
+        return make_response(400, {'message': f'A transaction supports at most {MAX_TRANSACT_ITEMS} operations'})
+
+    try:
+        transact_items = [build_transact_item(operation) for operation in operations]
+    except ValueError as e:
+        return make_response(400, {'message': 'Invalid operation', 'error': str(e)})
+
+    params = {'TransactItems': transact_items}
+    if data.get('client_request_token'):
+        params['ClientRequestToken'] = data['client_request_token']
+
+    try:
+        dynamodb = boto3.resource('dynamodb')
+        # The resource's client accepts plain Python types, like Table does
+        dynamodb.meta.client.transact_write_items(**params)
+        return make_response(200, {'message': 'Transaction completed successfully', 'operations': len(transact_items)})
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            logger.error(f"Error executing transaction: {e}")
+            return make_response(500, {'message': 'Internal Server Error', 'error': str(e)})
+        reasons = [
+            {
+                'index': index,
+                'type': operations[index].get('type'),
+                'code': reason.get('Code'),
+                'message': reason.get('Message')
+            }
+            for index, reason in enumerate(e.response.get('CancellationReasons', []))
+            if reason.get('Code') not in (None, 'None')
+        ]
+        logger.warning(f"Transaction cancelled: {reasons}")
+        return make_response(409, {'message': 'Transaction cancelled', 'cancellationReasons': reasons})
+    except Exception as e:
+        logger.error(f"Error executing transaction: {e}")
+        return make_response(500, {'message': 'Internal Server Error', 'error': str(e)})
+
+def build_transact_item(operation):
+    """
+    Translate a single /transact operation into a TransactWriteItems entry.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError('each operation must be an object')
+
+    match operation.get('type'):
+        case 'put':
+            item = operation.get('item')
+            if not isinstance(item, dict) or 'id' not in item:
+                raise ValueError("put requires an 'item' with an 'id'")
+            action, request = 'Put', {'Item': item}
+        case 'update':
+            require_fields(operation, 'id', 'attribute', 'value')
+            action, request = 'Update', {
+                'Key': {'id': operation['id']},
+                'UpdateExpression': 'SET #attr = :val',
+                'ExpressionAttributeNames': {'#attr': operation['attribute']},
+                'ExpressionAttributeValues': {':val': operation['value']}
+            }
+        case 'delete':
+            require_fields(operation, 'id')
+            action, request = 'Delete', {'Key': {'id': operation['id']}}
+        case 'condition_check':
+            require_fields(operation, 'id', 'attribute')
+            action, request = 'ConditionCheck', {'Key': {'id': operation['id']}}
+            add_condition(request, operation)
+        case other:
+            raise ValueError(f'unsupported operation type: {other}')
+
+    if action != 'ConditionCheck' and operation.get('condition'):
+        add_condition(request, operation['condition'])
+
+    request['TableName'] = 'crud'
+    return {action: request}
+
+def add_condition(request, condition):
+    """
+    Add an equality (or existence, when no value is given) condition on one attribute.
+    """
+    if not isinstance(condition, dict) or not condition.get('attribute'):
+        raise ValueError("condition requires an 'attribute'")
+    names = request.setdefault('ExpressionAttributeNames', {})
+    names['#cond'] = condition['attribute']
+    if 'value' in condition:
+        values = request.setdefault('ExpressionAttributeValues', {})
+        values[':cond'] = condition['value']
+        request['ConditionExpression'] = '#cond = :cond'
+    else:
+        request['ConditionExpression'] = 'attribute_exists(#cond)'
+
+def require_fields(operation, *fields):
+    """
+    Raise ValueError if any of the given fields is missing from an operation.
+    """
+    missing = [field for field in fields if field not in operation]
+    if missing:
+        raise ValueError(f"{operation.get('type')} is missing: {', '.join(missing)}")
+
 
 def make_response(status_code, body):
     """
@@ -0,0 +1,181 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+
+from core import app
+
+
+class StubClient:
+    """ Records transact_write_items calls and optionally raises"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def transact_write_items(self, **params):
+        self.calls.append(params)
+        if self.error is not None:
+            raise self.error
+
+
+@pytest.fixture()
+def stub_client(monkeypatch):
+    """ Replaces the DynamoDB resource with one backed by a StubClient"""
+
+    client = StubClient()
+    resource = SimpleNamespace(meta=SimpleNamespace(client=client))
+    monkeypatch.setattr(app.boto3, "resource", lambda service: resource)
+    return client
+
+
+def test_build_put():
+    item = app.build_transact_item({"type": "put", "item": {"id": "1", "name": "a"}})
+
+    assert item == {"Put": {"Item": {"id": "1", "name": "a"}, "TableName": "crud"}}
+
+
+def test_build_update():
+    item = app.build_transact_item({"type": "update", "id": "1", "attribute": "name", "value": "b"})
+
+    assert item == {
+        "Update": {
+            "Key": {"id": "1"},
+            "UpdateExpression": "SET #attr = :val",
+            "ExpressionAttributeNames": {"#attr": "name"},
+            "ExpressionAttributeValues": {":val": "b"},
+            "TableName": "crud",
+        }
+    }
+
+
+def test_build_delete():
+    item = app.build_transact_item({"type": "delete", "id": "1"})
+
+    assert item == {"Delete": {"Key": {"id": "1"}, "TableName": "crud"}}
+
+
+def test_build_condition_check():
+    item = app.build_transact_item({"type": "condition_check", "id": "1", "attribute": "status", "value": "open"})
+
+    assert item == {
+        "ConditionCheck": {
+            "Key": {"id": "1"},
+            "ExpressionAttributeNames": {"#cond": "status"},
+            "ExpressionAttributeValues": {":cond": "open"},
+            "ConditionExpression": "#cond = :cond",
+            "TableName": "crud",
+        }
+    }
+
+
+@pytest.mark.parametrize("operation", [
+    "put",
+    {"type": "put", "item": {"name": "a"}},
+    {"type": "update", "id": "1", "attribute": "name"},
+    {"type": "delete"},
+    {"type": "condition_check", "id": "1"},
+    {"type": "merge", "id": "1"},
+])
+def test_build_invalid_operation(operation):
+    with pytest.raises(ValueError):
+        app.build_transact_item(operation)
+
+
+def test_add_condition_with_value():
+    request = {"ExpressionAttributeNames": {"#attr": "name"}}
+    app.add_condition(request, {"attribute": "version", "value": 3})
+
+    assert request == {
+        "ExpressionAttributeNames": {"#attr": "name", "#cond": "version"},
+        "ExpressionAttributeValues": {":cond": 3},
+        "ConditionExpression": "#cond = :cond",
+    }
+
+
+def test_add_condition_attribute_exists():
+    request = {}
+    app.add_condition(request, {"attribute": "id"})
+
+    assert request == {
+        "ExpressionAttributeNames": {"#cond": "id"},
+        "ConditionExpression": "attribute_exists(#cond)",
+    }
+
+
+def test_add_condition_requires_attribute():
+    with pytest.raises(ValueError):
+        app.add_condition({}, {"value": 3})
+
+
+def test_build_delete_with_condition():
+    item = app.build_transact_item({"type": "delete", "id": "1", "condition": {"attribute": "id"}})
+
+    assert item["Delete"]["ConditionExpression"] == "attribute_exists(#cond)"
+    assert item["Delete"]["ExpressionAttributeNames"] == {"#cond": "id"}
+
+
+@pytest.mark.parametrize("operations", [None, [], "put"])
+def test_transact_requires_operations(operations, stub_client):
+    ret = app.transact({"operations": operations})
+
+    assert ret["statusCode"] == 400
+    assert stub_client.calls == []
+
+
+def test_transact_rejects_too_many_operations(stub_client):
+    operations = [{"type": "delete", "id": str(i)} for i in range(app.MAX_TRANSACT_ITEMS + 1)]
+    ret = app.transact({"operations": operations})
+
+    assert ret["statusCode"] == 400
+    assert str(app.MAX_TRANSACT_ITEMS) in json.loads(ret["body"])["message"]
+    assert stub_client.calls == []
+
+
+def test_transact_accepts_max_operations(stub_client):
+    operations = [{"type": "delete", "id": str(i)} for i in range(app.MAX_TRANSACT_ITEMS)]
+    ret = app.transact({"operations": operations, "client_request_token": "token-1"})
+
+    assert ret["statusCode"] == 200
+    assert json.loads(ret["body"])["operations"] == app.MAX_TRANSACT_ITEMS
+    assert len(stub_client.calls[0]["TransactItems"]) == app.MAX_TRANSACT_ITEMS
+    assert stub_client.calls[0]["ClientRequestToken"] == "token-1"
+
+
+def test_transact_cancelled(stub_client):
+    stub_client.error = ClientError(
+        {
+            "Error": {"Code": "TransactionCanceledException", "Message": "Transaction cancelled"},
+            "CancellationReasons": [
+                {"Code": "None"},
+                {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"},
+            ],
+        },
+        "TransactWriteItems",
+    )
+    ret = app.transact({"operations": [
+        {"type": "put", "item": {"id": "1"}},
+        {"type": "condition_check", "id": "2", "attribute": "status", "value": "open"},
+    ]})
+    data = json.loads(ret["body"])
+
+    assert ret["statusCode"] == 409
+    assert data["cancellationReasons"] == [
+        {
+            "index": 1,
+            "type": "condition_check",
+            "code": "ConditionalCheckFailed",
+            "message": "The conditional request failed",
+        }
+    ]
+
+
+def test_transact_other_client_error(stub_client):
+    stub_client.error = ClientError(
+        {"Error": {"Code": "ValidationException", "Message": "bad request"}},
+        "TransactWriteItems",
+    )
+    ret = app.transact({"operations": [{"type": "delete", "id": "1"}]})
+
+    assert ret["statusCode"] == 500